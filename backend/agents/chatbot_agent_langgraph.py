@@ -2,9 +2,12 @@ from typing import Annotated, TypedDict, Optional
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
-import mysql.connector
+from db import get_db_connection
+from conversation_store import get_conversation_store
+from intent_router import get_intent_router, POLICY_RAG, ACCOUNT_LOOKUP, COMPLAINT_STATUS, OUT_OF_SCOPE
+import re
 import json
 from datetime import datetime
 from dotenv import load_dotenv
@@ -12,6 +15,30 @@ import os
 
 load_dotenv()
 
+OUT_OF_SCOPE_REPLY = (
+    "Hello! I'm the BankSecure AI assistant. I can help with your account, balance, "
+    "transactions, KYC status, complaints and the bank's policies and procedures."
+)
+
+# Lookups answered from a single tool call and a template, without the LLM
+TRANSACTIONS_PATTERN = re.compile(r'\b(?:transactions?|payments|statement|history|spent|paid)\b', re.IGNORECASE)
+KYC_PATTERN = re.compile(r'\b(?:kyc|verification)\b', re.IGNORECASE)
+TRANSACTION_COUNT_PATTERN = re.compile(r'\b(?:last|latest|recent)\s+(\d{1,2})\b', re.IGNORECASE)
+SINGLE_TRANSACTION_PATTERN = re.compile(r'\b(?:last|latest|previous)\s+(?:transaction|payment)\b', re.IGNORECASE)
+# Questions that need reasoning over the data rather than just showing it
+OPEN_ENDED_PATTERN = re.compile(
+    r'\b(?:why|explain|should|could|compare|analy[sz]e|average|total|most|largest|biggest|'
+    r'between|since|suspicious|wrong|help me|budget|save)\b',
+    re.IGNORECASE
+)
+MAX_FAST_PATH_TRANSACTIONS = 20
+# Messages that lean on earlier turns ("does that apply to UPI too?", "what about NEFT?")
+FOLLOW_UP_PATTERN = re.compile(
+    r'^\s*(?:and|also|what about|how about|same)\b|'
+    r'\b(?:that|this|those|these|it|its|they|them|there|same|too|also|above|earlier|previous)\b',
+    re.IGNORECASE
+)
+
 # State definition
 class ChatbotState(TypedDict):
     messages: Annotated[list, add_messages]
@@ -22,13 +49,8 @@ class ChatbotState(TypedDict):
 class ChatbotAgentLangGraph:
     def __init__(self, rag_service=None):
         self.rag_service = rag_service
-        self.db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': 'root',
-            'database': 'banksecure'
-        }
-        
+        self.router = get_intent_router()
+        self.memory = get_conversation_store()
         # Initialize LLM
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
@@ -53,7 +75,7 @@ class ChatbotAgentLangGraph:
         self.graph = self._build_graph()
     
     def _get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return get_db_connection()
     
     def get_user_context(self, user_id: int) -> str:
         """Get comprehensive user context"""
@@ -169,14 +191,7 @@ class ChatbotAgentLangGraph:
     
     def should_use_rag(self, message: str) -> bool:
         """Determine if message should use RAG system"""
-        rag_keywords = [
-            'policy', 'procedure', 'refund', 'reversal', 'categories', 'types',
-            'delayed', 'partial', 'duplicate', 'failed', 'authentication',
-            'security', 'compliance', 'regulatory', 'transaction management',
-            'kyc policy', 'verification policy', 'issue categories'
-        ]
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in rag_keywords)
+        return self.router.route(message).intent == POLICY_RAG
     
     def chatbot_node(self, state: ChatbotState):
         """Main chatbot processing node"""
@@ -186,11 +201,16 @@ class ChatbotAgentLangGraph:
         # Determine if we should use RAG
         use_rag = self.should_use_rag(user_message)
         
+        # Exchanges older than the recent turns in `messages` survive as summary notes
+        summary = state.get("conversation_memory") or []
+        earlier = "\n".join(f"- {note}" for note in summary)
+        earlier = f"\nEarlier in this conversation:\n{earlier}\n" if earlier else ""
+        
         system_prompt = f"""You are an intelligent banking assistant for BankSecure AI.
 
 User ID: {user_id}
 Use RAG for this query: {use_rag}
-
+{earlier}
 You can help with:
 - Account information and balance inquiries
 - Transaction history and details
@@ -246,23 +266,211 @@ Respond naturally and call tools as needed to provide accurate information."""
         
         return builder.compile()
     
-    def process_message(self, message: str, user_id: Optional[int] = None):
-        """Process user message using LangGraph workflow"""
+    def _message_text(self, message) -> str:
+        content = message.content
+        if isinstance(content, list):
+            content = "".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+            )
+        return content
+    
+    def _format_amount(self, value) -> str:
+        try:
+            return f"₹{float(value):,.2f}"
+        except (TypeError, ValueError):
+            return str(value)
+    
+    def _render_account(self, account: dict, balance_only: bool) -> str:
+        balance = self._format_amount(account.get('balance'))
+        if balance_only:
+            return f"Your account {account.get('account_number')} ({account.get('account_type')}) has a balance of {balance}."
+        return "\n".join([
+            "Here are your account details:",
+            f"- Account number: {account.get('account_number')}",
+            f"- Account type: {account.get('account_type')}",
+            f"- Balance: {balance}",
+            f"- IFSC code: {account.get('ifsc_code')}",
+            f"- Branch: {account.get('branch_name')}",
+            f"- Status: {account.get('status')}"
+        ])
+    
+    def _render_transactions(self, transactions: list) -> str:
+        if not transactions:
+            return "You don't have any transactions yet."
+        lines = ["Here are your most recent transactions:"]
+        for t in transactions:
+            line = f"- {str(t.get('created_at', ''))[:16]}: {t.get('transaction_type', '').replace('_', ' ')} of {self._format_amount(t.get('amount'))} ({t.get('status')})"
+            if t.get('receiver_name'):
+                line += f" to {t['receiver_name']}"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def _render_kyc(self, kyc: dict) -> str:
+        if kyc.get('status') == 'not_found':
+            return "You haven't submitted KYC documents yet. You can start verification from your profile."
+        status = str(kyc.get('verification_status', 'pending')).replace('_', ' ')
+        return f"Your KYC verification status is: {status}."
+    
+    def _render_complaints(self, complaints: list) -> str:
+        if not complaints:
+            return "You don't have any complaints on record."
+        lines = ["Here are your most recent complaints:"]
+        for c in complaints:
+            line = f"- {c.get('complaint_id')} ({str(c.get('created_at', ''))[:10]}): {c.get('status')}"
+            if c.get('resolution_notes'):
+                line += f" - {c['resolution_notes']}"
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def _fast_path_reply(self, route, message: str, user_id: Optional[int]) -> Optional[str]:
+        """Answer simple lookups from one tool call and a template; None means use the graph"""
+        if user_id is None or route.intent not in (ACCOUNT_LOOKUP, COMPLAINT_STATUS):
+            return None
+        if OPEN_ENDED_PATTERN.search(message):
+            return None
         
-        # Run the graph
-        result = self.graph.invoke({
-            "messages": [HumanMessage(content=message)],
+        if route.intent == COMPLAINT_STATUS:
+            data = json.loads(self.get_complaint_status(user_id))
+            render = self._render_complaints
+        elif TRANSACTIONS_PATTERN.search(message):
+            count = TRANSACTION_COUNT_PATTERN.search(message)
+            if count:
+                limit = min(int(count.group(1)), MAX_FAST_PATH_TRANSACTIONS)
+            else:
+                limit = 1 if SINGLE_TRANSACTION_PATTERN.search(message) else 5
+            data = json.loads(self.get_transaction_history(user_id, limit))
+            render = self._render_transactions
+        elif KYC_PATTERN.search(message):
+            data = json.loads(self.get_kyc_status(user_id))
+            render = self._render_kyc
+        else:
+            data = json.loads(self.get_account_info(user_id))
+            balance_only = 'balance' in message.lower() or 'how much' in message.lower()
+            render = lambda account: self._render_account(account, balance_only)
+        
+        # Let the LLM explain lookup failures
+        if isinstance(data, dict) and 'error' in data:
+            return None
+        return render(data)
+    
+    def _history(self, user_id: Optional[int]) -> dict:
+        if user_id is None:
+            return {'summary': [], 'turns': []}
+        return self.memory.get_history(user_id)
+    
+    def _graph_inputs(self, message: str, user_id: Optional[int], history: dict) -> dict:
+        messages = []
+        for user_text, assistant_text in history['turns']:
+            messages.append(HumanMessage(content=user_text))
+            messages.append(AIMessage(content=assistant_text))
+        messages.append(HumanMessage(content=message))
+        return {
+            "messages": messages,
             "user_id": user_id,
             "user_context": {},
-            "conversation_memory": []
-        })
+            "conversation_memory": history['summary']
+        }
+    
+    def _use_direct_rag(self, route, message: str, history: dict) -> bool:
+        """Generic policy questions can skip the agent; "my ..." questions need its account tools.
+        
+        Follow-ups such as "does that apply to UPI too?" only make sense with the
+        earlier turns, which the RAG prompt doesn't see, so they go to the agent.
+        """
+        if route.intent != POLICY_RAG or route.personal or self.rag_service is None:
+            return False
+        return not (history['turns'] and FOLLOW_UP_PATTERN.search(message))
+    
+    def _answer(self, message: str, user_id: Optional[int], history: dict) -> str:
+        route = self.router.route(message)
+        print(f"Chat intent: {route.intent} ({route.method})")
+        
+        # Mid-conversation, even a short "ok" or "thanks" may be a follow-up
+        if route.intent == OUT_OF_SCOPE and not history['turns']:
+            return OUT_OF_SCOPE_REPLY
+        
+        reply = self._fast_path_reply(route, message, user_id)
+        if reply is not None:
+            return reply
         
-        return result
+        # Policy questions go straight to RAG: one Gemini call instead of the tool loop
+        if self._use_direct_rag(route, message, history):
+            result = self.rag_service.generate_response(message)
+            if result.get('has_context'):
+                return result['answer']
+        
+        # Run the graph
+        result = self.graph.invoke(self._graph_inputs(message, user_id, history))
+        return self._message_text(result["messages"][-1])
+    
+    def process_message(self, message: str, user_id: Optional[int] = None) -> str:
+        """Answer a user message in the context of the user's recent conversation"""
+        reply = self._answer(message, user_id, self._history(user_id))
+        # The canned out-of-scope reply carries no context worth remembering
+        if user_id is not None and reply != OUT_OF_SCOPE_REPLY:
+            self.memory.add_turn(user_id, message, reply)
+        return reply
+    
+    def _stream_answer(self, message: str, user_id: Optional[int], history: dict):
+        route = self.router.route(message)
+        
+        if route.intent == OUT_OF_SCOPE and not history['turns']:
+            yield OUT_OF_SCOPE_REPLY
+            return
+        
+        reply = self._fast_path_reply(route, message, user_id)
+        if reply is not None:
+            yield reply
+            return
+        
+        if self._use_direct_rag(route, message, history):
+            # Hold the first token back: without policy context the RAG answer is a
+            # single canned token, and the agent should answer instead
+            held, started = None, False
+            for event in self.rag_service.stream_response(message):
+                if event['type'] == 'token':
+                    if not started and held is None:
+                        held = event['text']
+                        continue
+                    if held is not None:
+                        yield held
+                        held = None
+                    started = True
+                    yield event['text']
+                elif event['type'] == 'error':
+                    raise RuntimeError(event['error'])
+                elif event['type'] == 'done':
+                    if started or event.get('has_context'):
+                        if held is not None:
+                            yield held
+                        return
+            if started:
+                return
+        
+        inputs = self._graph_inputs(message, user_id, history)
+        for chunk, metadata in self.graph.stream(inputs, stream_mode="messages"):
+            # Only the chatbot node's output is user-facing; tool results are not
+            if metadata.get("langgraph_node") != "chatbot":
+                continue
+            
+            content = self._message_text(chunk)
+            if content:
+                yield content
+    
+    def stream_message(self, message: str, user_id: Optional[int] = None):
+        """Yield the assistant's reply text as the LLM produces it"""
+        parts = []
+        for text in self._stream_answer(message, user_id, self._history(user_id)):
+            parts.append(text)
+            yield text
+        reply = "".join(parts)
+        if user_id is not None and reply != OUT_OF_SCOPE_REPLY:
+            self.memory.add_turn(user_id, message, reply)
     
     def chat_loop(self, user_id: Optional[int] = None):
         """Interactive chat loop"""
         print("BankSecure AI Assistant - Type 'exit' to quit")
-        conversation_history = []
         
         while True:
             try:
@@ -274,26 +482,8 @@ Respond naturally and call tools as needed to provide accurate information."""
                 if not user_input:
                     continue
                 
-                # Add to conversation history
-                conversation_history.append(HumanMessage(content=user_input))
-                
-                # Process message
-                result = self.graph.invoke({
-                    "messages": conversation_history,
-                    "user_id": user_id,
-                    "user_context": {},
-                    "conversation_memory": []
-                })
-                
-                # Get the last assistant message
-                last_message = result["messages"][-1]
-                if hasattr(last_message, 'content'):
-                    print(f"\nAssistant: {last_message.content}")
-                    conversation_history.append(last_message)
-                
-                # Keep conversation history manageable
-                if len(conversation_history) > 10:
-                    conversation_history = conversation_history[-10:]
+                # History is kept per user in the conversation store
+                print(f"\nAssistant: {self.process_message(user_input, user_id)}")
                     
             except KeyboardInterrupt:
                 print("\nGoodbye!")
@@ -4,7 +4,7 @@ from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
-import mysql.connector
+from db import get_db_connection
 import json
 import time
 import random
@@ -24,13 +24,6 @@ class ComplaintState(TypedDict):
 
 class ComplaintAgentLangGraph:
     def __init__(self):
-        self.db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': 'root',
-            'database': 'banksecure'
-        }
-        
         # Initialize LLM
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
@@ -58,7 +51,7 @@ class ComplaintAgentLangGraph:
         self.graph = self._build_graph()
     
     def _get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return get_db_connection()
     
     def get_complaint_context(self, complaint_id: str) -> str:
         """Get comprehensive complaint context for AI analysis with detailed logging"""
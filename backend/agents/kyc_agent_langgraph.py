@@ -4,7 +4,7 @@ from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
-import mysql.connector
+from db import get_db_connection
 import json
 import random
 from datetime import datetime
@@ -24,13 +24,6 @@ class KYCState(TypedDict):
 
 class KYCAgentLangGraph:
     def __init__(self):
-        self.db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': 'root',
-            'database': 'banksecure'
-        }
-        
         # Initialize LLM
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
@@ -54,7 +47,7 @@ class KYCAgentLangGraph:
         self.graph = self._build_graph()
     
     def _get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return get_db_connection()
     
     def get_kyc_context(self, kyc_id: int) -> str:
         """Get comprehensive KYC context for analysis"""
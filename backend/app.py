@@ -7,11 +7,16 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'rag'))
 
 try:
-    from rag.api import rag_bp
+    from rag.api import rag_bp, get_rag_service, sse_response
 except ImportError:
     rag_bp = None
+    get_rag_service = None
+    sse_response = None
 except Exception:
     rag_bp = None
+    get_rag_service = None
+    sse_response = None
+import threading
 import mysql.connector
 import hashlib
 import os
@@ -22,6 +27,12 @@ import io
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
+from db import get_db_connection, get_pool_stats
+from ocr_service import preload_ocr_readers
+from kyc_extraction import save_upload, extract_document_fields, get_extraction_stats
+from ocr_cache import get_ocr_cache
+from conversation_store import get_conversation_store
+from kyc_jobs import get_job_queue
 
 # Load environment variables
 load_dotenv()
@@ -42,25 +53,57 @@ if rag_bp:
 else:
     print("RAG API not available")
 
+# Chatbot agent (singleton, graph compiled once per worker)
+chatbot_agent = None
+_chatbot_lock = threading.Lock()
+
+def get_chatbot_agent():
+    global chatbot_agent
+    rag_service = get_rag_service() if get_rag_service else None
+    if chatbot_agent is None:
+        with _chatbot_lock:
+            if chatbot_agent is None:
+                from agents.chatbot_agent_langgraph import ChatbotAgentLangGraph
+                chatbot_agent = ChatbotAgentLangGraph(rag_service)
+    # Pick up a RAG service swapped in by /api/rag/reload
+    chatbot_agent.rag_service = rag_service
+    return chatbot_agent
+
+def warm_up_services():
+    """Load the RAG index and compile the chatbot graph before the first request"""
+    try:
+        start = time.time()
+        get_chatbot_agent()
+        print(f"Chat services warmed up in {time.time() - start:.2f}s")
+    except Exception as e:
+        print(f"Chat warm-up failed, services will load on first request: {e}")
+
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024
 
-def get_db_connection():
-    conn = mysql.connector.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', 'root'),  
-        database=os.getenv('DB_NAME', 'banksecure')
-    )
-    return conn
-
 @app.route('/api/test', methods=['GET'])
 def test_endpoint():
     return jsonify({'success': True, 'message': 'Backend is working'})
 
+@app.route('/api/test/db-pool', methods=['GET'])
+def db_pool_stats():
+    return jsonify({'success': True, 'pool': get_pool_stats()})
+
+@app.route('/api/test/ocr-cache', methods=['GET'])
+def ocr_cache_stats():
+    return jsonify({
+        'success': True,
+        'cache': get_ocr_cache().get_stats(),
+        'extraction': get_extraction_stats()
+    })
+
+@app.route('/api/test/chat-memory', methods=['GET'])
+def chat_memory_stats():
+    return jsonify({'success': True, 'memory': get_conversation_store().get_stats()})
+
 @app.route('/api/test/kyc', methods=['GET'])
 def test_kyc_data():
     conn = get_db_connection()
@@ -140,30 +183,6 @@ def login():
     else:
         return jsonify({'success': False, 'message': 'Incorrect password. Please try again.'})
 
-def fallback_regex_extraction(ocr_text, extracted_data, file_key):
-    """Fallback regex extraction if AI fails"""
-    import re
-    
-    # Extract Aadhaar number
-    aadhaar_patterns = [
-        r'\b\d{4}\s*\d{4}\s*\d{4}\b',
-        r'\b\d{12}\b'
-    ]
-    
-    for pattern in aadhaar_patterns:
-        match = re.search(pattern, ocr_text)
-        if match:
-            aadhaar = re.sub(r'\D', '', match.group())
-            if len(aadhaar) == 12:
-                extracted_data['aadhaar'] = aadhaar
-                break
-    
-    # Extract PAN number
-    pan_pattern = r'\b[A-Z]{5}\d{4}[A-Z]\b'
-    pan_match = re.search(pan_pattern, ocr_text.upper())
-    if pan_match:
-        extracted_data['pan'] = pan_match.group()
-
 @app.route('/api/kyc/submit', methods=['POST'])
 def complete_kyc_verification():
     try:
@@ -204,178 +223,154 @@ def complete_kyc_verification():
         kyc_record = cursor.fetchone()
         
         if not kyc_record:
+            conn.close()
             return jsonify({'success': False, 'error': 'KYC record not found. Please try again.'})
         
         kyc_id = kyc_record['id']
         
-        # Get user profile data for validation  
-        cursor.execute('SELECT full_name FROM users WHERE id = %s', (user_id,))
-        user_result = cursor.fetchone()
-        user_name = user_result['full_name'] if user_result else 'Unknown'
+        # Claim the record before touching files: a running job may still be reading the old uploads
+        job_queue = get_job_queue()
+        job_id, active_job = job_queue.reserve(user_id, kyc_id)
+        if job_id is None:
+            conn.close()
+            return jsonify({
+                'success': False,
+                'error': 'Your previous KYC submission is still being processed. Please wait for it to finish.',
+                'kyc_id': kyc_id,
+                'job_id': active_job['job_id'],
+                'job_status': active_job['status']
+            }), 409
         
-        cursor.execute('SELECT aadhaar_number, pan_number, profile_photo FROM profiles WHERE user_id = %s', (user_id,))
-        profile_result = cursor.fetchone()
-        profile_aadhaar = profile_result['aadhaar_number'] if profile_result else None
-        profile_pan = profile_result['pan_number'] if profile_result else None
-        profile_photo_path = profile_result['profile_photo'] if profile_result else None
-        
-        print(f"Profile data - Aadhaar: {profile_aadhaar}, PAN: {profile_pan}")
-        
-        # Process uploaded files and extract data using OCR
-        file_paths = {}
-        extracted_data = {}
-        
-        for file_key in ['aadhaar', 'address_proof', 'selfie']:
-            if file_key in request.files:
-                file = request.files[file_key]
-                if file.filename != '':
-                    # Delete old document of same type for this user
-                    cursor.execute('SELECT file_path FROM documents WHERE user_id = %s AND document_type = %s', (user_id, file_key))
-                    old_docs = cursor.fetchall()
-                    for old_doc in old_docs:
-                        if old_doc['file_path'] and os.path.exists(old_doc['file_path']):
-                            os.remove(old_doc['file_path'])
-                    
-                    # Delete old document records
-                    cursor.execute('DELETE FROM documents WHERE user_id = %s AND document_type = %s', (user_id, file_key))
-                    
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                    unique_filename = f"{file_key}_{timestamp}{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(file_path)
-                    file_paths[file_key] = file_path
-                    
-                    # Extract data using OCR
-                    try:
-                        import easyocr
-                        import re
-                        import fitz  # PyMuPDF for PDF handling
-                        
-                        reader = easyocr.Reader(['en'])
-                        ocr_text = ""
+        try:
+            # Save uploaded files; OCR and validation run in the background worker pool
+            file_paths = {}
+            file_hashes = {}
+            
+            for file_key in ['aadhaar', 'address_proof', 'selfie']:
+                if file_key in request.files:
+                    file = request.files[file_key]
+                    if file.filename != '':
+                        # Delete old document of same type for this user
+                        cursor.execute('SELECT file_path FROM documents WHERE user_id = %s AND document_type = %s', (user_id, file_key))
+                        old_docs = cursor.fetchall()
+                        for old_doc in old_docs:
+                            if old_doc['file_path'] and os.path.exists(old_doc['file_path']):
+                                os.remove(old_doc['file_path'])
                         
-                        # Handle PDF files
-                        if file_path.lower().endswith('.pdf'):
-                            doc = fitz.open(file_path)
-                            for page in doc:
-                                pix = page.get_pixmap()
-                                img_data = pix.tobytes("ppm")
-                                result = reader.readtext(img_data)
-                                ocr_text += " ".join([text[1] for text in result]) + "\n"
-                            doc.close()
-                        else:
-                            # Handle image files
-                            result = reader.readtext(file_path)
-                            ocr_text = " ".join([text[1] for text in result])
+                        # Delete old document records
+                        cursor.execute('DELETE FROM documents WHERE user_id = %s AND document_type = %s', (user_id, file_key))
                         
-                        print(f"\nEasyOCR extracted text from {file_key}:")
-                        print(ocr_text)
+                        filename = secure_filename(file.filename)
+                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
+                        unique_filename = f"{file_key}_{timestamp}{filename}"
+                        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+                        file_hashes[file_key] = save_upload(file, file_path)
+                        file_paths[file_key] = file_path
                         
-                        # Use AI to clean and extract data from OCR text
-                        try:
-                            import google.generativeai as genai
-                            genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-                            model = genai.GenerativeModel('gemini-pro')
-                            
-                            prompt = f"""
-                            Extract the following information from this OCR text:
-                            
-                            OCR Text: {ocr_text}
-                            
-                            Please extract and return ONLY:
-                            1. Aadhaar Number (12 digits)
-                            2. PAN Number (format: ABCDE1234F)
-                            3. Full Name
-                            
-                            Return in this exact JSON format:
-                            {{
-                                "aadhaar": "123456789012",
-                                "pan": "ABCDE1234F",
-                                "name": "FULL NAME"
-                            }}
-                            
-                            If any field is not found, use null. Only return the JSON, no other text.
-                            """
-                            
-                            response = model.generate_content(prompt)
-                            ai_result = response.text.strip()
-                            
-                            # Parse AI response
-                            import json
-                            try:
-                                ai_data = json.loads(ai_result)
-                                if ai_data.get('aadhaar'):
-                                    extracted_data['aadhaar'] = ai_data['aadhaar']
-                                if ai_data.get('pan'):
-                                    extracted_data['pan'] = ai_data['pan']
-                                if ai_data.get('name'):
-                                    extracted_data['name'] = ai_data['name']
-                                print(f"AI extracted: {ai_data}")
-                            except json.JSONDecodeError:
-                                print(f"AI response not valid JSON: {ai_result}")
-                                # Fallback to regex extraction
-                                fallback_regex_extraction(ocr_text, extracted_data, file_key)
-                        except Exception as e:
-                            print(f"AI extraction failed: {e}")
-                            # Fallback to regex extraction
-                            fallback_regex_extraction(ocr_text, extracted_data, file_key)
-                    
-                    except Exception as e:
-                        print(f"OCR extraction failed for {file_key}: {e}")
-                    
-                    cursor.execute(
-                        '''INSERT INTO documents (user_id, kyc_id, document_type, file_name, file_path, 
-                           file_size, mime_type, uploaded_at)
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())''',
-                        (user_id, kyc_id, file_key, unique_filename, file_path, 
-                         os.path.getsize(file_path), getattr(file, 'content_type', 'application/octet-stream'))
-                    )
-        
-        # Simple mock validation for now
-        print(f"Documents uploaded for user {user_id}:")
-        for key, path in file_paths.items():
-            print(f"- {key}: {os.path.basename(path)}")
-        
-        conn.commit()
-        conn.close()
-        
-        # Compare extracted data with profile data for auto-approval
-        extracted_aadhaar = extracted_data.get('aadhaar')
-        extracted_pan = extracted_data.get('pan')
-        extracted_name = extracted_data.get('name')
-        
-        print(f"\n=== KYC VALIDATION FOR USER {user_id} ===")
-        print(f"Profile data - Aadhaar: {profile_aadhaar}, PAN: {profile_pan}")
-        print(f"Extracted data - Aadhaar: {extracted_aadhaar}, PAN: {extracted_pan}, Name: {extracted_name}")
-        
-        # Check if extracted data matches profile (both Aadhaar and PAN must match)
-        aadhaar_match = (extracted_aadhaar and profile_aadhaar and 
-                        profile_aadhaar.replace(' ', '') == extracted_aadhaar.replace(' ', ''))
-        pan_match = (extracted_pan and profile_pan and profile_pan.upper() == extracted_pan.upper())
-        
-        print(f"Comparison results - Aadhaar match: {aadhaar_match}, PAN match: {pan_match}")
-        
-        # Auto-approve only if both Aadhaar and PAN match
-        if aadhaar_match and pan_match:
-            status = 'verified'
-            print(f"✅ KYC AUTO-APPROVED - Data matches profile")
-        else:
-            status = 'pending'
-            print(f"⏳ KYC PENDING - Data doesn't match profile, requires manual review")
+                        cursor.execute(
+                            '''INSERT INTO documents (user_id, kyc_id, document_type, file_name, file_path, 
+                               file_size, mime_type, uploaded_at)
+                               VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())''',
+                            (user_id, kyc_id, file_key, unique_filename, file_path, 
+                             os.path.getsize(file_path), getattr(file, 'content_type', 'application/octet-stream'))
+                        )
+            
+            print(f"Documents uploaded for user {user_id}:")
+            for key, path in file_paths.items():
+                print(f"- {key}: {os.path.basename(path)}")
+            
+            conn.commit()
+            conn.close()
+        except Exception:
+            job_queue.cancel(job_id, 'Upload failed')
+            raise
         
-        print(f"Final verification status: {status}")
-        print("=" * 50)
+        job_queue.start(job_id, process_kyc_documents, user_id, kyc_id, file_paths, file_hashes)
+        print(f"KYC job {job_id} queued for user {user_id}")
         
-        verification_data = {
-            'extracted_aadhaar': extracted_aadhaar,
-            'extracted_pan': extracted_pan,
-            'extracted_name': extracted_name,
-            'face_similarity': 1.0
-        }
+        return jsonify({
+            'success': True, 
+            'message': 'KYC documents submitted successfully! Verification is in progress.',
+            'kyc_id': kyc_id,
+            'job_id': job_id,
+            'job_status': 'queued',
+            'status': 'pending',
+            'auto_approved': False
+        })
         
-        import json
-        conn2 = get_db_connection()
+    except Exception as e:
+        print(f"ERROR in complete_kyc_verification: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+def process_kyc_documents(user_id, kyc_id, file_paths, file_hashes):
+    """Background KYC step: OCR the uploads, extract identifiers and auto-approve on a profile match"""
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        # Get user profile data for validation
+        cursor.execute('SELECT aadhaar_number, pan_number FROM profiles WHERE user_id = %s', (user_id,))
+        profile_result = cursor.fetchone()
+    finally:
+        conn.close()
+    
+    profile_aadhaar = profile_result['aadhaar_number'] if profile_result else None
+    profile_pan = profile_result['pan_number'] if profile_result else None
+    
+    print(f"Profile data - Aadhaar: {profile_aadhaar}, PAN: {profile_pan}")
+    
+    # Extract data from uploaded files using OCR
+    extracted_data = {}
+    extraction_methods = {}
+    
+    for file_key, file_path in file_paths.items():
+        try:
+            result = extract_document_fields(file_path, file_hashes[file_key], file_key)
+            extraction_methods[file_key] = result['method']
+            for key, value in result['fields'].items():
+                if value:
+                    extracted_data[key] = value
+        except Exception as e:
+            print(f"OCR extraction failed for {file_key}: {e}")
+    
+    # Compare extracted data with profile data for auto-approval
+    extracted_aadhaar = extracted_data.get('aadhaar')
+    extracted_pan = extracted_data.get('pan')
+    extracted_name = extracted_data.get('name')
+    
+    print(f"\n=== KYC VALIDATION FOR USER {user_id} ===")
+    print(f"Profile data - Aadhaar: {profile_aadhaar}, PAN: {profile_pan}")
+    print(f"Extracted data - Aadhaar: {extracted_aadhaar}, PAN: {extracted_pan}, Name: {extracted_name}")
+    
+    # Check if extracted data matches profile (both Aadhaar and PAN must match)
+    aadhaar_match = (extracted_aadhaar and profile_aadhaar and 
+                    profile_aadhaar.replace(' ', '') == extracted_aadhaar.replace(' ', ''))
+    pan_match = (extracted_pan and profile_pan and profile_pan.upper() == extracted_pan.upper())
+    
+    print(f"Comparison results - Aadhaar match: {aadhaar_match}, PAN match: {pan_match}")
+    
+    # Auto-approve only if both Aadhaar and PAN match
+    if aadhaar_match and pan_match:
+        status = 'verified'
+        print(f"✅ KYC AUTO-APPROVED - Data matches profile")
+    else:
+        status = 'pending'
+        print(f"⏳ KYC PENDING - Data doesn't match profile, requires manual review")
+    
+    print(f"Final verification status: {status}")
+    print("=" * 50)
+    
+    verification_data = {
+        'extracted_aadhaar': extracted_aadhaar,
+        'extracted_pan': extracted_pan,
+        'extracted_name': extracted_name,
+        'extraction_methods': extraction_methods,
+        'face_similarity': 1.0
+    }
+    
+    import json
+    conn2 = get_db_connection()
+    try:
         cursor2 = conn2.cursor()
         cursor2.execute(
             'UPDATE kyc_verification SET ai_feedback = %s, verification_status = %s WHERE id = %s',
@@ -403,19 +398,13 @@ def complete_kyc_verification():
             cursor2.execute('UPDATE users SET role = %s WHERE id = %s', ('verified_customer', user_id))
         
         conn2.commit()
+    finally:
         conn2.close()
-        
-        return jsonify({
-            'success': True, 
-            'message': 'KYC documents submitted successfully!' + (' Your bank account has been created.' if status == 'verified' else ' Documents are under review.'),
-            'kyc_id': kyc_id,
-            'status': status,
-            'auto_approved': status == 'verified'
-        })
-        
-    except Exception as e:
-        print(f"ERROR in complete_kyc_verification: {e}")
-        return jsonify({'success': False, 'error': str(e)})
+    
+    return {
+        'status': status,
+        'auto_approved': status == 'verified'
+    }
 
 @app.route('/api/profile/<int:user_id>', methods=['GET'])
 def get_profile(user_id):
@@ -618,6 +607,34 @@ def get_kyc_status(user_id):
     finally:
         conn.close()
 
+@app.route('/api/kyc/jobs/<job_id>', methods=['GET'])
+def get_kyc_job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'KYC job not found'}), 404
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute('SELECT verification_status FROM kyc_verification WHERE id = %s', (job['kyc_id'],))
+        kyc_record = cursor.fetchone()
+        status = kyc_record['verification_status'] if kyc_record else 'not_submitted'
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'job_status': job['status'],
+            'kyc_id': job['kyc_id'],
+            'status': status,
+            'auto_approved': bool(job['result'] and job['result'].get('auto_approved')),
+            'error': job['error']
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        conn.close()
+
 @app.route('/api/manager/users', methods=['GET'])
 def get_users():
     conn = get_db_connection()
@@ -887,6 +904,9 @@ def reject_kyc():
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
+    finally:
+        conn.close()
+
 @app.route('/api/manager/kyc-applications', methods=['GET'])
 def get_kyc_applications():
     conn = get_db_connection()
@@ -1277,6 +1297,7 @@ def submit_complaint():
         transaction = cursor.fetchone()
         
         if not transaction:
+            conn.close()
             return jsonify({'success': False, 'message': 'Transaction not found'})
         
         # Generate complaint ID
@@ -1653,97 +1674,12 @@ def extract_document():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
         unique_filename = f"extract_{timestamp}{filename}"
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-        
-        extracted_data = {}
+        content_hash = save_upload(file, file_path)
         
         try:
-            import easyocr
-            import fitz  # PyMuPDF
-            
-            reader = easyocr.Reader(['en'])
-            ocr_text = ""
-            
-            # Handle PDF files
-            if file_path.lower().endswith('.pdf'):
-                doc = fitz.open(file_path)
-                for page in doc:
-                    pix = page.get_pixmap()
-                    img_data = pix.tobytes("ppm")
-                    result = reader.readtext(img_data)
-                    ocr_text += " ".join([text[1] for text in result]) + "\n"
-                doc.close()
-            else:
-                # Handle image files
-                result = reader.readtext(file_path)
-                ocr_text = " ".join([text[1] for text in result])
-            
-            # Use AI to extract structured data
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-                model = genai.GenerativeModel('gemini-pro')
-                
-                prompt = f"""
-                Extract the following information from this OCR text:
-                
-                OCR Text: {ocr_text}
-                
-                Please extract and return ONLY:
-                1. Aadhaar Number (12 digits)
-                2. PAN Number (format: ABCDE1234F)
-                3. Full Name
-                
-                Return in this exact JSON format:
-                {{
-                    "aadhaar": "123456789012",
-                    "pan": "ABCDE1234F",
-                    "name": "FULL NAME"
-                }}
-                
-                If any field is not found, use null. Only return the JSON, no other text.
-                """
-                
-                ai_result = model.generate_content(prompt).text.strip()
-                
-                # Parse AI response
-                import json
-                try:
-                    ai_data = json.loads(ai_result)
-                    extracted_data = {
-                        'aadhaar': ai_data.get('aadhaar'),
-                        'pan': ai_data.get('pan'),
-                        'name': ai_data.get('name')
-                    }
-                except json.JSONDecodeError:
-                    # Fallback regex extraction
-                    import re
-                    aadhaar_pattern = r'\b\d{4}\s*\d{4}\s*\d{4}\b'
-                    pan_pattern = r'\b[A-Z]{5}\d{4}[A-Z]\b'
-                    
-                    aadhaar_match = re.search(aadhaar_pattern, ocr_text)
-                    pan_match = re.search(pan_pattern, ocr_text.upper())
-                    
-                    extracted_data = {
-                        'aadhaar': re.sub(r'\D', '', aadhaar_match.group()) if aadhaar_match else None,
-                        'pan': pan_match.group() if pan_match else None,
-                        'name': None
-                    }
-            except Exception as e:
-                print(f"AI extraction failed: {e}")
-                # Fallback regex extraction
-                import re
-                aadhaar_pattern = r'\b\d{4}\s*\d{4}\s*\d{4}\b'
-                pan_pattern = r'\b[A-Z]{5}\d{4}[A-Z]\b'
-                
-                aadhaar_match = re.search(aadhaar_pattern, ocr_text)
-                pan_match = re.search(pan_pattern, ocr_text.upper())
-                
-                extracted_data = {
-                    'aadhaar': re.sub(r'\D', '', aadhaar_match.group()) if aadhaar_match else None,
-                    'pan': pan_match.group() if pan_match else None,
-                    'name': None
-                }
+            result = extract_document_fields(file_path, content_hash, 'document')
+            ocr_text = result['ocr_text']
+            extracted_data = result['fields']
             
             # Clean up temp file
             if os.path.exists(file_path):
@@ -1752,6 +1688,7 @@ def extract_document():
             return jsonify({
                 'success': True,
                 'extracted_data': extracted_data,
+                'extraction_method': result['method'],
                 'ocr_text': ocr_text[:500]  # Return first 500 chars for preview
             })
             
@@ -2086,6 +2023,19 @@ def create_test_escalated_complaints():
     finally:
         conn.close()
 
+def stream_chat_events(message, user_id):
+    """Chat reply as SSE events: one 'token' event per chunk, then 'done'"""
+    try:
+        print(f"Streaming message: '{message}' for user: {user_id}")
+        chatbot = get_chatbot_agent()
+        for text in chatbot.stream_message(message, user_id):
+            yield {'type': 'token', 'text': text}
+        yield {'type': 'done'}
+    except Exception as e:
+        print(f"Chatbot streaming error: {e}")
+        traceback.print_exc()
+        yield {'type': 'error', 'error': str(e)}
+
 @app.route('/api/chat', methods=['POST'])
 def chat_with_bot():
     try:
@@ -2093,21 +2043,25 @@ def chat_with_bot():
         message = data.get('message', '')
         user_id = data.get('user_id')
         
+        # Start a fresh conversation; the history is otherwise kept server-side per user
+        if data.get('reset') and user_id is not None:
+            get_conversation_store().clear(user_id)
+        
         if not message:
             return jsonify({
                 'success': True,
                 'response': 'Please type a message to get started!'
             })
         
+        # Opt-in streaming: reply tokens are forwarded as Server-Sent Events
+        if data.get('stream') and sse_response:
+            return sse_response(stream_chat_events(message, user_id))
+        
         # RAG chatbot only
         try:
             print(f"Processing message: '{message}' for user: {user_id}")
-            from agents.chatbot_agent_langgraph import ChatbotAgentLangGraph
-            from rag.rag_service import RAGService
-            
-            rag_service = RAGService()
-            chatbot = ChatbotAgentLangGraph(rag_service)
-            print("Chatbot initialized, calling process_message...")
+            chatbot = get_chatbot_agent()
+            print("Chatbot ready, calling process_message...")
             response = chatbot.process_message(message, user_id)
             print(f"Chatbot response: {response}")
             
@@ -2131,5 +2085,22 @@ def chat_with_bot():
             'response': 'Hello! I am your AI banking assistant. How can I help you today?'
         })
 
+def start_background_services():
+    """Startup hook: warm the chat services and optionally preload OCR readers.
+
+    Called from the __main__ block (or wsgi.py), never at import. The OCR page
+    and DOCX parser pools use the spawn start method, which re-imports the main
+    module in every child; doing this work at import would rebuild the RAG
+    service, BM25 index and chatbot graph in each of them.
+    """
+    if os.getenv('CHAT_WARMUP', 'true').lower() == 'true':
+        warm_up_services()
+
+    if os.getenv('OCR_PRELOAD', 'false').lower() == 'true':
+        preload_ocr_readers()
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
+    # With the debug reloader, only the child process that serves requests warms up
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
+    app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,98 @@
+import os
+import re
+import threading
+from dotenv import load_dotenv
+from cache import create_cache
+
+load_dotenv()
+
+# Process-wide store, created lazily on first use
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+
+def _first_sentence(text, limit):
+    text = re.sub(r'\s+', ' ', text).strip()
+    sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 3].rstrip() + '...'
+
+
+class ConversationStore:
+    """Recent chat exchanges per user, so follow-up questions keep their context.
+
+    Each session keeps the last ``max_turns`` exchanges verbatim (truncated to
+    ``max_turn_chars``); older exchanges are folded into a rolling summary of
+    one-line notes capped at ``max_summary_chars``. Sessions live in a
+    ``create_cache`` backend, so with RAG_CACHE_BACKEND=sqlite or redis every
+    worker process sees the same history. Sessions idle for longer than
+    ``idle_ttl`` seconds expire, and the least recently active ones are evicted
+    beyond ``max_sessions`` (or ``max_total_chars`` in the in-memory backend).
+    """
+
+    def __init__(self, max_sessions=1000, idle_ttl=1800, max_turns=6, max_turn_chars=1000,
+                 max_summary_chars=1200, max_total_chars=5_000_000):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.max_turn_chars = max_turn_chars
+        self.max_summary_chars = max_summary_chars
+        self.max_total_chars = max_total_chars
+        self._sessions = create_cache(
+            'chat_sessions', max_size=max_sessions, ttl=idle_ttl, max_bytes=max_total_chars
+        )
+        # Serialises read-modify-write of a session within this process
+        self._lock = threading.Lock()
+        self.summarised_turns = 0
+
+    def get_history(self, user_id):
+        """Return {'summary': [...], 'turns': [(user_text, assistant_text), ...]} for a user"""
+        session = self._sessions.get(str(user_id))
+        if session is None:
+            return {'summary': [], 'turns': []}
+        return {'summary': list(session['summary']), 'turns': [tuple(turn) for turn in session['turns']]}
+
+    def add_turn(self, user_id, user_message, assistant_message):
+        key = str(user_id)
+        turn = [user_message[:self.max_turn_chars], assistant_message[:self.max_turn_chars]]
+
+        with self._lock:
+            session = self._sessions.get(key) or {'turns': [], 'summary': []}
+            session['turns'].append(turn)
+
+            while len(session['turns']) > self.max_turns:
+                user_text, assistant_text = session['turns'].pop(0)
+                session['summary'].append(
+                    f"User asked: {_first_sentence(user_text, 120)} Assistant: {_first_sentence(assistant_text, 160)}"
+                )
+                self.summarised_turns += 1
+
+            while session['summary'] and sum(len(note) for note in session['summary']) > self.max_summary_chars:
+                session['summary'].pop(0)
+
+            # Writing the session back restarts its idle TTL
+            self._sessions.set(key, session)
+
+    def clear(self, user_id):
+        self._sessions.delete(str(user_id))
+
+    def get_stats(self):
+        stats = self._sessions.stats()
+        stats['summarised_turns'] = self.summarised_turns
+        stats['idle_ttl'] = self.idle_ttl
+        return stats
+
+
+def get_conversation_store():
+    global _conversation_store
+    if _conversation_store is None:
+        with _conversation_store_lock:
+            if _conversation_store is None:
+                _conversation_store = ConversationStore(
+                    max_sessions=int(os.getenv('CHAT_MEMORY_MAX_SESSIONS', '1000')),
+                    idle_ttl=int(os.getenv('CHAT_MEMORY_IDLE_TTL', '1800')),
+                    max_turns=int(os.getenv('CHAT_MEMORY_MAX_TURNS', '6')),
+                    max_turn_chars=int(os.getenv('CHAT_MEMORY_MAX_TURN_CHARS', '1000')),
+                    max_summary_chars=int(os.getenv('CHAT_MEMORY_MAX_SUMMARY_CHARS', '1200')),
+                    max_total_chars=int(os.getenv('CHAT_MEMORY_MAX_TOTAL_CHARS', '5000000'))
+                )
+    return _conversation_store
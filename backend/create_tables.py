@@ -1,6 +1,7 @@
 import mysql.connector
 from dotenv import load_dotenv
 import os
+from kyc_jobs import KYC_JOBS_TABLE_SQL
 
 load_dotenv()
 
@@ -87,6 +88,9 @@ def create_database_tables():
             )
         ''')
         
+        # Background KYC job state, shared by every app worker process
+        cursor.execute(KYC_JOBS_TABLE_SQL)
+        
         # Accounts table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS accounts (
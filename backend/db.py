@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+import mysql.connector
+from mysql.connector import pooling
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Process-wide pool, created lazily on first checkout
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolTimeoutError(mysql.connector.Error):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+
+class PooledConnection:
+    """Checked-out connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for code paths that return before closing
+        if not getattr(self, '_released', True):
+            self._pool.stats['leaked_returns'] += 1
+            self.close()
+
+
+class ConnectionPool:
+    def __init__(self, pool_size=10, checkout_timeout=10.0, **db_config):
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name='banksecure_pool',
+            pool_size=pool_size,
+            pool_reset_session=True,
+            **db_config
+        )
+        # mysql.connector raises immediately when the pool is empty, so a
+        # semaphore gives callers a bounded wait instead
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'waits': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'timeouts': 0,
+            'leaked_returns': 0
+        }
+        print(f"MySQL connection pool created (size={pool_size})")
+
+    def get_connection(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._stats_lock:
+                self.stats['timeouts'] += 1
+            raise PoolTimeoutError(
+                msg=f"No database connection available within {self.checkout_timeout}s"
+            )
+        wait_ms = (time.perf_counter() - start) * 1000
+
+        # MySQLConnectionPool.get_connection already checks is_connected() and
+        # reconnects stale connections, so no extra ping is needed here
+        conn = None
+        try:
+            conn = self._pool.get_connection()
+            pooled = PooledConnection(self, conn)
+        except Exception:
+            # PooledMySQLConnection has no __del__; without close() the
+            # connection would never return to the mysql.connector pool
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._slots.release()
+            raise
+
+        with self._stats_lock:
+            self.stats['checkouts'] += 1
+            self.stats['in_use'] += 1
+            self.stats['peak_in_use'] = max(self.stats['peak_in_use'], self.stats['in_use'])
+            self.stats['total_wait_ms'] += wait_ms
+            self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], wait_ms)
+            if wait_ms >= 1:
+                self.stats['waits'] += 1
+
+        return pooled
+
+    def _release(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._stats_lock:
+                self.stats['in_use'] -= 1
+            self._slots.release()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['pool_size'] = self.pool_size
+        stats['avg_wait_ms'] = round(stats['total_wait_ms'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        return stats
+
+
+def get_db_config():
+    """Database settings shared by every module, read from the environment"""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', 'root'),
+        'database': os.getenv('DB_NAME', 'banksecure')
+    }
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+                    checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                    **get_db_config()
+                )
+    return _pool
+
+
+def get_db_connection():
+    """Check out a pooled connection; call close() to return it"""
+    return get_pool().get_connection()
+
+
+def get_pool_stats():
+    if _pool is None:
+        return {'initialized': False}
+    return {'initialized': True, **_pool.get_stats()}
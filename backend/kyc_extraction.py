@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+from ocr_service import extract_text
+from ocr_cache import get_ocr_cache
+
+load_dotenv()
+
+EXTRACTION_PROMPT = """
+Extract the following information from this OCR text:
+
+OCR Text: {ocr_text}
+
+Please extract and return ONLY:
+1. Aadhaar Number (12 digits)
+2. PAN Number (format: ABCDE1234F)
+3. Full Name
+
+Return in this exact JSON format:
+{{
+    "aadhaar": "123456789012",
+    "pan": "ABCDE1234F",
+    "name": "FULL NAME"
+}}
+
+If any field is not found, use null. Only return the JSON, no other text.
+"""
+
+# Verhoeff tables used by UIDAI for the Aadhaar check digit
+VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0]
+]
+VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8]
+]
+
+AADHAAR_CANDIDATE_PATTERN = re.compile(r'(?<!\d)(\d{4}\s?\d{4}\s?\d{4})(?!\d)')
+PAN_PATTERN = re.compile(r'\b[A-Z]{5}\d{4}[A-Z]\b')
+
+# Per-method extraction counters, used to measure how often Gemini is skipped
+_extraction_stats = {}
+_extraction_stats_lock = threading.Lock()
+
+
+def save_upload(file, file_path, chunk_size=64 * 1024):
+    """Stream an uploaded file to disk and return the SHA-256 of its content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as out:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def fallback_regex_extraction(ocr_text, extracted_data, file_key):
+    """Fallback regex extraction if AI fails"""
+    # Extract Aadhaar number
+    aadhaar_patterns = [
+        r'\b\d{4}\s*\d{4}\s*\d{4}\b',
+        r'\b\d{12}\b'
+    ]
+
+    for pattern in aadhaar_patterns:
+        match = re.search(pattern, ocr_text)
+        if match:
+            aadhaar = re.sub(r'\D', '', match.group())
+            if len(aadhaar) == 12:
+                extracted_data['aadhaar'] = aadhaar
+                break
+
+    # Extract PAN number
+    pan_pattern = r'\b[A-Z]{5}\d{4}[A-Z]\b'
+    pan_match = re.search(pan_pattern, ocr_text.upper())
+    if pan_match:
+        extracted_data['pan'] = pan_match.group()
+
+
+def is_valid_aadhaar(number):
+    """12 digits, not starting with 0/1, with a valid Verhoeff check digit"""
+    if len(number) != 12 or not number.isdigit() or number[0] in '01':
+        return False
+    checksum = 0
+    for i, digit in enumerate(reversed(number)):
+        checksum = VERHOEFF_D[checksum][VERHOEFF_P[i % 8][int(digit)]]
+    return checksum == 0
+
+
+def regex_fast_path(ocr_text):
+    """Deterministic extraction when the OCR text is unambiguous.
+
+    Each KYC document carries one identifier type, so the fast path accepts
+    the result when at least one identifier is found and neither type has
+    more than one distinct candidate. Returns None when Gemini is needed.
+    """
+    aadhaar_candidates = {re.sub(r'\D', '', m) for m in AADHAAR_CANDIDATE_PATTERN.findall(ocr_text)}
+    valid_aadhaar = {n for n in aadhaar_candidates if is_valid_aadhaar(n)}
+    pan_candidates = set(PAN_PATTERN.findall(ocr_text.upper()))
+
+    # Checksum failures usually mean OCR misread a digit; let Gemini look at it
+    if len(valid_aadhaar) != len(aadhaar_candidates):
+        return None
+    if len(valid_aadhaar) > 1 or len(pan_candidates) > 1:
+        return None
+    if not valid_aadhaar and not pan_candidates:
+        return None
+
+    return {
+        'aadhaar': next(iter(valid_aadhaar), None),
+        'pan': next(iter(pan_candidates), None),
+        'name': None
+    }
+
+
+def record_extraction(method, elapsed):
+    with _extraction_stats_lock:
+        stats = _extraction_stats.setdefault(method, {'count': 0, 'total_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += elapsed * 1000
+
+
+def get_extraction_stats():
+    with _extraction_stats_lock:
+        return {
+            method: {
+                'count': stats['count'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2)
+            }
+            for method, stats in _extraction_stats.items()
+        }
+
+
+def extract_fields(ocr_text, file_key):
+    """Extract Aadhaar/PAN/name from OCR text, trying the regex fast path before Gemini.
+
+    Returns the fields and the method that produced them
+    ('regex_fast_path', 'ai' or 'regex_fallback').
+    """
+    start = time.time()
+    fields = regex_fast_path(ocr_text)
+    if fields:
+        print(f"Regex fast path extracted for {file_key}: {fields}")
+        record_extraction('regex_fast_path', time.time() - start)
+        return fields, 'regex_fast_path'
+
+    fields, method = _extract_fields_with_ai(ocr_text, file_key)
+    record_extraction(method, time.time() - start)
+    return fields, method
+
+
+def _extract_fields_with_ai(ocr_text, file_key):
+    fields = {'aadhaar': None, 'pan': None, 'name': None}
+
+    # Use AI to clean and extract data from OCR text
+    try:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+        model = genai.GenerativeModel('gemini-pro')
+
+        response = model.generate_content(EXTRACTION_PROMPT.format(ocr_text=ocr_text))
+        ai_result = response.text.strip()
+
+        # Parse AI response
+        try:
+            ai_data = json.loads(ai_result)
+            for key in fields:
+                fields[key] = ai_data.get(key)
+            print(f"AI extracted: {ai_data}")
+            return fields, 'ai'
+        except json.JSONDecodeError:
+            print(f"AI response not valid JSON: {ai_result}")
+    except Exception as e:
+        print(f"AI extraction failed: {e}")
+
+    # Fallback to regex extraction
+    fallback_regex_extraction(ocr_text, fields, file_key)
+    return fields, 'regex_fallback'
+
+
+def extract_document_fields(file_path, content_hash, file_key):
+    """OCR a saved upload and extract its identifiers, reusing cached results for identical files.
+
+    A cache hit skips EasyOCR; the extracted fields are reused too when they came
+    from Gemini or the regex fast path, otherwise extraction is retried on the
+    cached OCR text.
+    """
+    cache = get_ocr_cache()
+    cached = cache.get(content_hash)
+
+    if cached and cached['method'] in ('ai', 'regex_fast_path'):
+        record_extraction('cache', 0.0)
+        print(f"OCR cache hit for {file_key} ({content_hash[:12]})")
+        return {'ocr_text': cached['ocr_text'], 'fields': cached['fields'], 'method': 'cache'}
+
+    if cached:
+        print(f"OCR cache hit for {file_key} ({content_hash[:12]}), re-running extraction")
+        ocr_text = cached['ocr_text']
+    else:
+        ocr_text = extract_text(file_path)
+
+    print(f"\nEasyOCR extracted text from {file_key}:")
+    print(ocr_text)
+
+    fields, method = extract_fields(ocr_text, file_key)
+    cache.put(content_hash, ocr_text, fields, method)
+
+    return {'ocr_text': ocr_text, 'fields': fields, 'method': method}
@@ -0,0 +1,171 @@
+import os
+import json
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import mysql.connector
+from dotenv import load_dotenv
+from db import get_db_connection
+
+load_dotenv()
+
+# Job state lives in MySQL so every worker process can answer status polls. The
+# unique active_kyc_id is set only while a job is queued or processing, which makes
+# "one running job per KYC record" hold across processes.
+KYC_JOBS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS kyc_jobs (
+        id CHAR(32) PRIMARY KEY,
+        user_id INT NOT NULL,
+        kyc_id INT NOT NULL,
+        active_kyc_id INT NULL UNIQUE,
+        status ENUM('queued', 'processing', 'completed', 'failed') DEFAULT 'queued',
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_kyc_jobs_kyc_id (kyc_id)
+    )
+'''
+
+
+class KYCJobQueue:
+    """Background worker pool for KYC document processing with pollable job state.
+
+    Jobs run in this process's thread pool; their state is stored in the kyc_jobs
+    table. A job left queued or processing for longer than ``stale_after`` seconds
+    (its worker process died) no longer blocks a resubmission.
+    """
+
+    def __init__(self, max_workers=2, job_ttl=3600, stale_after=900):
+        self.job_ttl = job_ttl
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='kyc-worker')
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(KYC_JOBS_TABLE_SQL)
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"KYC job queue started with {max_workers} worker(s)")
+
+    def reserve(self, user_id, kyc_id):
+        """Claim ``kyc_id`` for a new job; returns (job_id, None) or (None, the job still running for it).
+
+        A second job for the same KYC record would OCR files the resubmission
+        deletes and race the first one's verification_status write, so only
+        one job per record may be queued or processing at a time.
+        """
+        job_id = uuid.uuid4().hex
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                '''UPDATE kyc_jobs SET status = 'failed', error = 'Worker stopped', active_kyc_id = NULL
+                   WHERE active_kyc_id = %s AND updated_at < NOW() - INTERVAL %s SECOND''',
+                (kyc_id, self.stale_after)
+            )
+            cursor.execute(
+                '''DELETE FROM kyc_jobs
+                   WHERE status IN ('completed', 'failed') AND updated_at < NOW() - INTERVAL %s SECOND''',
+                (self.job_ttl,)
+            )
+            conn.commit()
+            try:
+                cursor.execute(
+                    'INSERT INTO kyc_jobs (id, user_id, kyc_id, active_kyc_id, status) VALUES (%s, %s, %s, %s, %s)',
+                    (job_id, user_id, kyc_id, kyc_id, 'queued')
+                )
+            except mysql.connector.IntegrityError:
+                conn.rollback()
+                cursor.execute('SELECT id FROM kyc_jobs WHERE active_kyc_id = %s', (kyc_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise  # finished between the insert and the lookup; let the user retry
+                return None, self.get(row['id'])
+            conn.commit()
+            return job_id, None
+        finally:
+            conn.close()
+
+    def start(self, job_id, func, *args):
+        """Run a reserved job in the worker pool"""
+        self._executor.submit(self._run, job_id, func, *args)
+
+    def cancel(self, job_id, error):
+        """Release a reserved job that will never start"""
+        self._update(job_id, status='failed', error=error)
+
+    def submit(self, func, user_id, kyc_id, *args):
+        """Reserve and start a job; returns None while another job for ``kyc_id`` is active"""
+        job_id, _ = self.reserve(user_id, kyc_id)
+        if job_id is not None:
+            self.start(job_id, func, user_id, kyc_id, *args)
+        return job_id
+
+    def _run(self, job_id, func, *args):
+        try:
+            self._update(job_id, status='processing')
+            result = func(*args)
+            self._update(job_id, status='completed', result=result)
+        except Exception as e:
+            print(f"ERROR in KYC job {job_id}: {e}")
+            traceback.print_exc()
+            self._update(job_id, status='failed', error=str(e))
+
+    def _update(self, job_id, status, result=None, error=None):
+        # Finished jobs give up the record so it can be resubmitted
+        finished = status in ('completed', 'failed')
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'''UPDATE kyc_jobs SET status = %s, result = %s, error = %s
+                    {', active_kyc_id = NULL' if finished else ''} WHERE id = %s''',
+                (status, json.dumps(result) if result is not None else None, error, job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                'SELECT id, user_id, kyc_id, status, result, error, created_at, updated_at FROM kyc_jobs WHERE id = %s',
+                (job_id,)
+            )
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            'job_id': row['id'],
+            'user_id': row['user_id'],
+            'kyc_id': row['kyc_id'],
+            'status': row['status'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'].timestamp(),
+            'updated_at': row['updated_at'].timestamp()
+        }
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = KYCJobQueue(
+                    max_workers=int(os.getenv('KYC_WORKERS', '2')),
+                    job_ttl=int(os.getenv('KYC_JOB_TTL', '3600')),
+                    stale_after=int(os.getenv('KYC_JOB_STALE_SECONDS', '900'))
+                )
+    return _job_queue
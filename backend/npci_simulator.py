@@ -1,6 +1,7 @@
 import random
 import time
 from datetime import datetime
+from db import get_db_connection
 
 class NPCISimulator:
     def __init__(self):
@@ -25,13 +26,7 @@ class NPCISimulator:
         self.txn_cache = set()
 
     def _get_db_connection(self):
-        import mysql.connector
-        return mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='root',
-            database='banksecure'
-        )
+        return get_db_connection()
 
     def process_transaction(self, user_id, receiver_account, amount, receiver_name):
         """Main NPCI transaction processing"""
@@ -0,0 +1,55 @@
+import os
+import threading
+from dotenv import load_dotenv
+from rag.cache import SQLiteCache
+
+load_dotenv()
+
+# Process-wide cache handle, created lazily on first use
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+class OCRCache(SQLiteCache):
+    """Persistent OCR/extraction results keyed by the SHA-256 of the uploaded file.
+
+    A SQLiteCache table, so every worker process shares the same entries; once
+    ``max_entries`` is exceeded the least recently used rows are evicted.
+    """
+
+    def __init__(self, path='ocr_cache.sqlite3', max_entries=1000):
+        super().__init__(path=path, max_size=max_entries, table='ocr_results')
+        self.max_entries = max_entries
+        # Column-per-field table written by earlier versions
+        conn = self._get_conn()
+        conn.execute('DROP TABLE IF EXISTS ocr_cache')
+        conn.commit()
+
+    def put(self, content_hash, ocr_text, fields, method):
+        self.set(content_hash, {
+            'ocr_text': ocr_text,
+            'fields': {key: fields.get(key) for key in ('aadhaar', 'pan', 'name')},
+            'method': method
+        })
+
+    def get_stats(self):
+        stats = self.stats()
+        return {
+            'hits': stats['hits'],
+            'misses': stats['misses'],
+            'evictions': stats['evictions'],
+            'entries': stats['size'],
+            'max_entries': self.max_entries
+        }
+
+
+def get_ocr_cache():
+    global _ocr_cache
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                _ocr_cache = OCRCache(
+                    path=os.getenv('OCR_CACHE_PATH', 'ocr_cache.sqlite3'),
+                    max_entries=int(os.getenv('OCR_CACHE_MAX_ENTRIES', '1000'))
+                )
+    return _ocr_cache
@@ -0,0 +1,225 @@
+import os
+import queue
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Process-wide reader pool, created lazily on first use
+_reader_pool = None
+_reader_pool_lock = threading.Lock()
+
+# Process pool for multi-page PDFs, created lazily on first use
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+# Reader owned by a page worker process
+_process_reader = None
+
+# Defaults match PyMuPDF's get_pixmap(); the caps keep one large upload from hogging the page workers
+PDF_DPI = min(int(os.getenv('OCR_PDF_DPI', '72')), int(os.getenv('OCR_PDF_MAX_DPI', '300')))
+PDF_MAX_PAGES = int(os.getenv('OCR_PDF_MAX_PAGES', '10'))
+PDF_TIMEOUT = float(os.getenv('OCR_PDF_TIMEOUT', '300'))
+
+
+class OCRReaderPool:
+    """Bounded pool of EasyOCR readers shared across requests.
+
+    Readers are created on demand up to ``size``; once the pool is full,
+    callers wait for a reader to be handed back instead of loading new models.
+    """
+
+    def __init__(self, size=2, languages=None, checkout_timeout=120.0):
+        self.size = size
+        self.languages = languages or ['en']
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_reader(self):
+        import easyocr
+        start = time.time()
+        reader = easyocr.Reader(self.languages)
+        print(f"EasyOCR reader loaded in {time.time() - start:.2f}s")
+        return reader
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._create_reader()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No OCR reader available within {self.checkout_timeout}s")
+
+    def release(self, reader):
+        self._idle.put(reader)
+
+    @contextmanager
+    def reader(self):
+        reader = self.acquire()
+        try:
+            yield reader
+        finally:
+            self.release(reader)
+
+    def preload(self):
+        """Load every reader up front so the first KYC upload doesn't pay for it"""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._create_reader())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        print(f"OCR reader pool preloaded with {self.size} reader(s)")
+
+
+def get_reader_pool():
+    global _reader_pool
+    if _reader_pool is None:
+        with _reader_pool_lock:
+            if _reader_pool is None:
+                _reader_pool = OCRReaderPool(
+                    size=int(os.getenv('OCR_POOL_SIZE', '2')),
+                    checkout_timeout=float(os.getenv('OCR_POOL_TIMEOUT', '120'))
+                )
+    return _reader_pool
+
+
+def preload_ocr_readers():
+    try:
+        get_reader_pool().preload()
+    except Exception as e:
+        print(f"OCR preload failed, readers will load on first use: {e}")
+
+
+def _render_page(page, dpi):
+    pix = page.get_pixmap(dpi=dpi)
+    return pix.tobytes("ppm")
+
+
+def _init_page_worker(languages):
+    global _process_reader
+    import easyocr
+    _process_reader = easyocr.Reader(languages)
+
+
+def _ocr_pdf_page(args):
+    """Rasterise and recognise one PDF page inside a page worker process"""
+    import fitz
+
+    file_path, page_number, dpi = args
+    doc = fitz.open(file_path)
+    try:
+        img_data = _render_page(doc[page_number], dpi)
+    finally:
+        doc.close()
+    result = _process_reader.readtext(img_data)
+    return " ".join([text[1] for text in result])
+
+
+def get_page_executor():
+    global _page_executor
+    if _page_executor is None:
+        with _page_executor_lock:
+            if _page_executor is None:
+                workers = int(os.getenv('OCR_PDF_PROCESSES', str(min(4, os.cpu_count() or 1))))
+                # spawn, not fork: the parent holds Flask threads and torch state
+                _page_executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_page_worker,
+                    initargs=(get_reader_pool().languages,)
+                )
+                print(f"PDF page OCR process pool started with {workers} worker(s)")
+    return _page_executor
+
+
+def _discard_page_executor(executor):
+    """Drop a broken page pool so the next PDF starts a fresh one"""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is executor:
+            _page_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _ocr_pages_in_process(doc, page_count):
+    with get_reader_pool().reader() as reader:
+        page_texts = []
+        for page_number in range(page_count):
+            result = reader.readtext(_render_page(doc[page_number], PDF_DPI))
+            page_texts.append(" ".join([text[1] for text in result]))
+    return "".join(text + "\n" for text in page_texts)
+
+
+def _extract_pdf_text(file_path):
+    import fitz  # PyMuPDF for PDF handling
+
+    doc = fitz.open(file_path)
+    try:
+        page_count = doc.page_count
+        if page_count > PDF_MAX_PAGES:
+            print(f"PDF has {page_count} pages, only the first {PDF_MAX_PAGES} will be OCR'd")
+            page_count = PDF_MAX_PAGES
+
+        if page_count <= 1:
+            # Not worth the IPC round trip; use an in-process reader
+            return _ocr_pages_in_process(doc, page_count)
+    finally:
+        doc.close()
+
+    # map() yields results in page order regardless of completion order
+    tasks = [(file_path, page_number, PDF_DPI) for page_number in range(page_count)]
+    executor = get_page_executor()
+    try:
+        return "".join(text + "\n" for text in executor.map(_ocr_pdf_page, tasks, timeout=PDF_TIMEOUT))
+    except BrokenProcessPool as e:
+        # A page worker died (e.g. killed when out of memory); every later submit
+        # to this pool would fail too
+        print(f"PDF page OCR pool is broken ({e}), restarting it and OCR-ing this PDF in-process")
+        _discard_page_executor(executor)
+
+    doc = fitz.open(file_path)
+    try:
+        return _ocr_pages_in_process(doc, page_count)
+    finally:
+        doc.close()
+
+
+def extract_text(file_path):
+    """Run OCR over an uploaded image or PDF and return the recognised text"""
+    # Handle PDF files
+    if file_path.lower().endswith('.pdf'):
+        return _extract_pdf_text(file_path)
+
+    # Handle image files
+    with get_reader_pool().reader() as reader:
+        result = reader.readtext(file_path)
+    return " ".join([text[1] for text in result])
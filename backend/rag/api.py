@@ -1,18 +1,55 @@
-from flask import Blueprint, request, jsonify
+import os
+import json
+import threading
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from rag_service import RAGService
 
 # Create RAG blueprint
 rag_bp = Blueprint('rag', __name__, url_prefix='/api/rag')
 
-# Initialize RAG service (singleton)
+MAX_BATCH_QUESTIONS = int(os.getenv('RAG_BATCH_MAX_QUESTIONS', '500'))
+
+# Initialize RAG service (singleton, shared by all request threads)
 rag_service = None
+_rag_lock = threading.Lock()
+# Serialises reloads and incremental updates: each one loads or rewrites the whole
+# index, and a reload racing an update would drop the update
+_reload_lock = threading.Lock()
 
 def get_rag_service():
     global rag_service
     if rag_service is None:
-        rag_service = RAGService()
+        with _rag_lock:
+            if rag_service is None:
+                rag_service = RAGService()
     return rag_service
 
+def reload_rag_service(rebuild=False):
+    """Build a fresh RAG service and swap it in; requests keep using the old one until then"""
+    global rag_service
+    with _reload_lock:
+        if rag_service is not None:
+            # Hand recent query embeddings on to the new service through the cache file
+            rag_service.retriever.save_query_cache()
+        new_service = RAGService()
+        if rebuild:
+            new_service.retriever._create_index()
+        with _rag_lock:
+            rag_service = new_service
+    return new_service
+
+def sse_response(events):
+    """Send an iterable of event dicts as Server-Sent Events"""
+    def generate():
+        for event in events:
+            yield f"data: {json.dumps(event)}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @rag_bp.route('/query', methods=['POST'])
 def rag_query():
     """RAG query endpoint"""
@@ -34,7 +71,13 @@ def rag_query():
         
         # Get RAG response
         rag = get_rag_service()
-        response = rag.query(question)
+        use_cache = not data.get('no_cache', False)
+        
+        # Opt-in streaming: tokens are forwarded as Server-Sent Events
+        if data.get('stream') or request.args.get('stream') == '1':
+            return sse_response(rag.query_stream(question, use_cache=use_cache))
+        
+        response = rag.query(question, use_cache=use_cache)
         
         return jsonify({
             'success': True,
@@ -49,11 +92,115 @@ def rag_query():
             'error': f'Internal server error: {str(e)}'
         }), 500
 
+@rag_bp.route('/query/batch', methods=['POST'])
+def rag_query_batch():
+    """Answer a list of questions in one request"""
+    try:
+        data = request.get_json(silent=True) or {}
+        questions = data.get('questions')
+        
+        if not isinstance(questions, list) or not questions:
+            return jsonify({
+                'success': False,
+                'error': 'questions must be a non-empty list'
+            }), 400
+        
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BATCH_QUESTIONS} questions per batch'
+            }), 400
+        
+        if not all(isinstance(q, str) and q.strip() for q in questions):
+            return jsonify({
+                'success': False,
+                'error': 'Questions cannot be empty'
+            }), 400
+        
+        rag = get_rag_service()
+        response = rag.query_batch(
+            [q.strip() for q in questions],
+            use_cache=not data.get('no_cache', False),
+            max_concurrency=data.get('max_concurrency')
+        )
+        
+        return jsonify({
+            'success': True,
+            **response
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Internal server error: {str(e)}'
+        }), 500
+
+@rag_bp.route('/reload', methods=['POST'])
+def rag_reload():
+    """Reload the FAISS index (optionally rebuilding it from rag_documents)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        rag = reload_rag_service(rebuild=bool(data.get('rebuild', False)))
+        
+        return jsonify({
+            'success': True,
+            'message': 'RAG service reloaded',
+            'indexed_chunks': rag.retriever.vector_store.index.ntotal
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Reload failed: {str(e)}'
+        }), 500
+
+@rag_bp.route('/update', methods=['POST'])
+def rag_update():
+    """Incrementally re-index added, changed or removed policy documents"""
+    try:
+        with _reload_lock:
+            rag = get_rag_service()
+            summary = rag.retriever.update_index()
+            
+            # Cached answers may quote the old policy text
+            if summary['changed'] or summary['removed']:
+                rag.clear_cache()
+        
+        return jsonify({
+            'success': True,
+            **summary,
+            'indexed_chunks': rag.retriever.vector_store.index.ntotal
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Update failed: {str(e)}'
+        }), 500
+
+@rag_bp.route('/stats', methods=['GET'])
+def rag_stats():
+    """Cache statistics for the RAG service"""
+    try:
+        rag = get_rag_service()
+        return jsonify({
+            'success': True,
+            'response_cache': rag.response_cache.stats(),
+            'query_embedding_cache': rag.retriever.query_cache.stats(),
+            'semantic_cache': rag.semantic_cache.stats(),
+            'request_coalescing': rag.inflight.stats()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @rag_bp.route('/health', methods=['GET'])
 def rag_health():
     """RAG service health check"""
     try:
-        rag = get_rag_service()
+        get_rag_service()
         return jsonify({
             'success': True,
             'status': 'healthy',
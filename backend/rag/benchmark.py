@@ -0,0 +1,175 @@
+# benchmark.py
+"""Offline RAG benchmark: index build time, retrieval recall@k, query latency and cache hit ratios.
+
+Uses the deterministic stubs in benchmark_stubs.py instead of Gemini, so it runs
+without network access or an API key. Run from backend/:
+
+    python rag/benchmark.py --k 3 --passes 2 --llm-latency-ms 800
+
+The labelled query set lives in benchmark_queries.json. Absolute latencies exclude
+the real API round trips (add them with --embed-latency-ms / --llm-latency-ms);
+recall with hashed embeddings is a lower bound for semantic embeddings, useful for
+comparing retrieval modes and index settings against each other.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+# Keep the run hermetic: no persisted query cache, no shared cache backend
+os.environ["QUERY_EMBEDDING_CACHE_PATH"] = ""
+os.environ["RAG_CACHE_BACKEND"] = "memory"
+
+from benchmark_stubs import HashingEmbedder, StubLLM
+from retriever import Retriever
+from rag_service import RAGService
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_queries.json")
+
+
+def latency_summary(latencies):
+    values = np.array(latencies) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+
+def benchmark_retrieval(retriever, queries, k, min_score):
+    """Recall@k / MRR at document level, dense-only vs hybrid"""
+    report = {}
+    for mode, hybrid in (("dense", False), ("hybrid", True)):
+        retriever.hybrid_search = hybrid
+        retriever.query_cache.clear()
+        latencies, hits, reciprocal_ranks = [], 0, []
+
+        for item in queries:
+            start = time.perf_counter()
+            results = retriever.retrieve(item["question"], k=k, min_score=min_score)
+            latencies.append(time.perf_counter() - start)
+
+            sources = [r["source"] for r in results]
+            rank = next((i + 1 for i, s in enumerate(sources) if s in item["relevant_sources"]), None)
+            hits += rank is not None
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+        report[mode] = {
+            f"recall@{k}": round(hits / len(queries), 4),
+            "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+            **latency_summary(latencies)
+        }
+
+    retriever.hybrid_search = True
+    return report
+
+
+def benchmark_service(service, queries, passes):
+    """End-to-end RAGService.query latency per pass (pass 1 cold, later passes warm)"""
+    service.clear_cache()
+    service.retriever.query_cache.clear()
+    report = {}
+    for n in range(1, passes + 1):
+        latencies = []
+        for item in queries:
+            start = time.perf_counter()
+            service.query(item["question"])
+            latencies.append(time.perf_counter() - start)
+        report[f"pass_{n}"] = latency_summary(latencies)
+
+    report["caches"] = {
+        "response_cache": service.response_cache.stats(),
+        "semantic_cache": service.semantic_cache.stats(),
+        "query_embedding_cache": service.retriever.query_cache.stats(),
+        "request_coalescing": service.inflight.stats()
+    }
+    return report
+
+
+def benchmark_batch(service, queries):
+    service.clear_cache()
+    service.retriever.query_cache.clear()
+    start = time.perf_counter()
+    response = service.query_batch([item["question"] for item in queries], use_cache=False)
+    return {"questions": len(queries), "wall_ms": round((time.perf_counter() - start) * 1000, 3), **response["timings"]}
+
+
+def print_report(report):
+    print(f"\nIndex build: {report['build']['seconds']:.3f}s for {report['build']['chunks']} chunks")
+
+    print(f"\n{'retrieval':<10} {'recall':>8} {'mrr':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for mode, row in report["retrieval"].items():
+        recall = next(v for key, v in row.items() if key.startswith("recall@"))
+        print(f"{mode:<10} {recall:>8.4f} {row['mrr']:>8.4f} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f}")
+
+    print(f"\n{'query':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in report["service"].items():
+        if name.startswith("pass_"):
+            print(f"{name:<10} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f}")
+
+    print("\nCache hit ratios:")
+    for name, stats in report["service"]["caches"].items():
+        ratio = stats.get("hit_ratio", stats.get("collapse_ratio"))
+        print(f"  {name:<24} {ratio:.4f}")
+
+    print(f"\nBatch of {report['batch']['questions']}: {report['batch']['wall_ms']:.1f} ms "
+          f"(retrieval {report['batch']['retrieval_ms']} ms, generation {report['batch']['generation_ms']} ms)")
+    print(f"Stub calls: {report['calls']['embedding_calls']} embedding, {report['calls']['llm_calls']} LLM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", default="rag_documents")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--min-score", type=float, default=0.0)
+    parser.add_argument("--passes", type=int, default=2)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        queries = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix="rag_benchmark_")
+    try:
+        embedder = HashingEmbedder(args.dimension, args.embed_latency_ms)
+        llm = StubLLM(args.llm_latency_ms)
+
+        start = time.perf_counter()
+        retriever = Retriever(
+            os.path.join(work_dir, "rag_index.faiss"),
+            os.path.join(work_dir, "rag_metadata.jsonl"),
+            embedder=embedder,
+            documents_folder=args.documents
+        )
+        build = {"seconds": round(time.perf_counter() - start, 3), "chunks": retriever.vector_store.index.ntotal}
+
+        service = RAGService(retriever=retriever, model=llm)
+        report = {
+            "build": build,
+            "retrieval": benchmark_retrieval(retriever, queries, args.k, args.min_score),
+            "service": benchmark_service(service, queries, args.passes),
+            "batch": benchmark_batch(service, queries)
+        }
+        report["calls"] = {"embedding_calls": embedder.calls, "llm_calls": llm.calls}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
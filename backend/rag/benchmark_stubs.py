@@ -0,0 +1,84 @@
+# benchmark_stubs.py
+"""Deterministic, offline stand-ins for the Gemini embedder and LLM used by benchmark.py"""
+
+import re
+import time
+import zlib
+import numpy as np
+
+
+class HashingEmbedder:
+    """Feature-hashed word and character-trigram vectors.
+
+    Same interface as EmbeddingGenerator, no network: identical text always maps to
+    the same L2-normalised vector, and texts sharing words/trigrams score higher.
+    """
+
+    def __init__(self, dimension=256, latency_ms=0.0):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000
+        self.model = f"stub-hashing-{dimension}"
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _features(self, text):
+        words = re.findall(r'[a-z0-9]+', text.lower())
+        features = [f"w:{w}" for w in words]
+        for w in words:
+            padded = f"#{w}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dimension] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _call(self, texts):
+        # One simulated API round trip per call, however many texts it carries
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) if t and t.strip() else None for t in texts]
+
+    def generate_embedding(self, text, task_type="retrieval_document"):
+        return self._call([text])[0]
+
+    def generate_embeddings_batch(self, texts, batch_size=None):
+        return self._call(texts)
+
+    def generate_query_embedding(self, query):
+        return self._call([query])[0]
+
+    def generate_query_embeddings_batch(self, queries):
+        return self._call(queries)
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubLLM:
+    """Stands in for genai.GenerativeModel: echoes the first policy chunk after a fixed delay"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def _answer(self, prompt):
+        match = re.search(r'\[From [^\]]+\]: (.*)', prompt)
+        return f"Stub answer based on: {match.group(1)[:200]}" if match else "Stub answer"
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._answer(prompt)
+        if stream:
+            return [_StubResponse(word + " ") for word in text.split()]
+        return _StubResponse(text)
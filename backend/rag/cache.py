@@ -0,0 +1,291 @@
+# cache.py
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional per-entry TTL, memory cap and hit/miss counters.
+
+    ``max_bytes`` bounds the approximate JSON size of the stored values on top of
+    the ``max_size`` entry limit.
+    """
+
+    def __init__(self, max_size=1000, ttl=None, max_bytes=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sizeof(self, value):
+        if self.max_bytes is None:
+            return 0
+        return len(json.dumps(value, default=str))
+
+    def _pop(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._pop(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        ttl = ttl if ttl is not None else self.ttl
+        if expires_at is None and ttl is not None:
+            expires_at = time.time() + ttl
+        size = self._sizeof(value)
+
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_size or (
+                self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1
+            ):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def items(self):
+        """Live (key, value, expires_at) entries, least recently used first"""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, value, expires_at)
+                for key, (value, expires_at, _) in self._data.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'backend': 'memory',
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+            if self.max_bytes is not None:
+                stats['bytes'] = self._bytes
+                stats['max_bytes'] = self.max_bytes
+            return stats
+
+
+class SQLiteCache:
+    """JSON values in a SQLite file, shared by every worker process on the host.
+
+    Same get/set/delete/clear/stats interface as LRUCache; expired rows are dropped on
+    read and the least recently used rows once ``max_size`` is exceeded.
+    """
+
+    def __init__(self, path='rag_cache.sqlite3', max_size=1000, ttl=None, table='cache'):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.table = table
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        conn = self._get_conn()
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table} (last_used)')
+        conn.commit()
+
+    def _get_conn(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, stat):
+        with self._stats_lock:
+            setattr(self, stat, getattr(self, stat) + 1)
+
+    def get(self, key):
+        now = time.time()
+        conn = self._get_conn()
+        row = conn.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+
+        if row and row[1] is not None and row[1] <= now:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            conn.commit()
+            row = None
+
+        if not row:
+            self._count('misses')
+            return None
+
+        conn.execute(f'UPDATE {self.table} SET last_used = ? WHERE key = ?', (now, key))
+        conn.commit()
+        self._count('hits')
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        conn = self._get_conn()
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now + ttl if ttl is not None else None, now)
+        )
+        cursor = conn.execute(
+            f'''DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )''',
+            (self.max_size,)
+        )
+        conn.commit()
+
+        if cursor.rowcount > 0:
+            with self._stats_lock:
+                self.evictions += cursor.rowcount
+
+    def delete(self, key):
+        conn = self._get_conn()
+        conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._get_conn()
+        conn.execute(f'DELETE FROM {self.table}')
+        conn.commit()
+
+    def __len__(self):
+        return self._get_conn().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def stats(self):
+        size = len(self)
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'size': size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class RedisCache:
+    """JSON values in Redis (or any Redis-compatible server) shared across hosts.
+
+    Eviction is left to the server's maxmemory policy; TTLs use native expiry.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=None, prefix='rag:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.client.ping()
+        self.ttl = ttl
+        self.prefix = prefix
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        with self._stats_lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        # Millisecond expiry: ex=int(ttl) would be 0 (rejected by Redis) for sub-second TTLs
+        px = max(1, int(ttl * 1000)) if ttl is not None else None
+        self.client.set(self.prefix + key, json.dumps(value), px=px)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'redis',
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def create_cache(prefix, max_size=1000, ttl=None, max_bytes=None):
+    """Build the cache backend selected by RAG_CACHE_BACKEND (memory, sqlite or redis).
+
+    ``prefix`` names the cache (table name / key prefix) so several caches can
+    share one backend.
+    """
+    backend = os.getenv('RAG_CACHE_BACKEND', 'memory').lower()
+
+    try:
+        if backend == 'sqlite':
+            return SQLiteCache(
+                path=os.getenv('RAG_CACHE_PATH', 'rag_cache.sqlite3'),
+                max_size=max_size, ttl=ttl, table=prefix
+            )
+        if backend == 'redis':
+            return RedisCache(
+                url=os.getenv('RAG_CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+                ttl=ttl, prefix=f'{prefix}:'
+            )
+    except Exception as e:
+        print(f"Could not initialize {backend} cache backend, using in-memory cache: {e}")
+
+    return LRUCache(max_size=max_size, ttl=ttl, max_bytes=max_bytes)
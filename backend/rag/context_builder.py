@@ -0,0 +1,107 @@
+# context_builder.py
+
+import math
+from lexical_index import tokenize
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count (~4 characters per token for English text)"""
+    return math.ceil(len(text) / 4)
+
+
+def _similarity(a, b):
+    """Jaccard overlap of the chunks' term sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr_select(results, lambda_=0.7, duplicate_threshold=0.8):
+    """Order results by maximal marginal relevance, dropping near-duplicates.
+
+    Each step picks the chunk maximising
+    ``lambda_ * score - (1 - lambda_) * max similarity to already picked chunks``.
+    """
+    candidates = [(result, set(tokenize(result['content']))) for result in results]
+    selected = []
+
+    while candidates:
+        best, best_value = None, None
+        for i, (result, terms) in enumerate(candidates):
+            redundancy = max((_similarity(terms, picked) for _, picked in selected), default=0.0)
+            if redundancy >= duplicate_threshold:
+                continue
+            value = lambda_ * result['score'] - (1 - lambda_) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = i, value
+        if best is None:
+            break
+        selected.append(candidates.pop(best))
+
+    return [result for result, _ in selected]
+
+
+def _chunk_index(result):
+    return result.get('metadata', {}).get('chunk_index')
+
+
+def _join_overlapping(first, second, max_overlap=200):
+    """Concatenate consecutive chunks, removing the text the splitter repeated between them"""
+    for size in range(min(len(first), len(second), max_overlap), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first} {second}"
+
+
+def merge_adjacent(results):
+    """Merge chunks with consecutive chunk_index from the same source into one passage.
+
+    Passages keep the position of their best-ranked chunk.
+    """
+    by_key = {(r['source'], _chunk_index(r)): rank for rank, r in enumerate(results)}
+    passages = []
+    seen = set()
+
+    for rank, result in enumerate(results):
+        key = (result['source'], _chunk_index(result))
+        if key in seen:
+            continue
+        if key[1] is None:
+            seen.add(key)
+            passages.append((rank, result['source'], result['content'], result['score']))
+            continue
+
+        # Walk back to the first chunk of this consecutive run, then forward
+        start = key[1]
+        while (key[0], start - 1) in by_key and (key[0], start - 1) not in seen:
+            start -= 1
+        content, score, index = None, result['score'], start
+        while (key[0], index) in by_key and (key[0], index) not in seen:
+            part = results[by_key[(key[0], index)]]
+            content = part['content'] if content is None else _join_overlapping(content, part['content'])
+            score = max(score, part['score'])
+            seen.add((key[0], index))
+            index += 1
+        passages.append((rank, key[0], content, score))
+
+    passages.sort(key=lambda passage: passage[0])
+    return [{'source': source, 'content': content, 'score': score} for _, source, content, score in passages]
+
+
+def assemble_context(results, max_tokens, lambda_=0.7):
+    """Pick chunks by MMR within a token budget and merge neighbouring ones.
+
+    Chunks that don't fit are skipped rather than ending selection, so a smaller
+    relevant chunk further down can still use the remaining budget.
+    """
+    chosen = []
+    used = 0
+    for result in mmr_select(results, lambda_=lambda_):
+        # Source attribution costs a few tokens per chunk
+        cost = estimate_tokens(result['content']) + estimate_tokens(f"[From {result['source']}]: ")
+        if used + cost > max_tokens:
+            continue
+        chosen.append(result)
+        used += cost
+
+    return merge_adjacent(chosen)
@@ -1,14 +1,29 @@
 import os
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from docx import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+
+def _load_file_chunks(args):
+    """Parse and chunk one DOCX file inside an ingestion worker process"""
+    documents_folder, filename, chunk_size, chunk_overlap = args
+    loader = DocumentLoader(documents_folder, chunk_size, chunk_overlap)
+    return loader.chunk_file(filename)
+
+
 class DocumentLoader:
-    def __init__(self, documents_folder="rag_documents"):
+    def __init__(self, documents_folder="rag_documents", chunk_size=500, chunk_overlap=50):
         self.documents_folder = documents_folder
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
         )
+        self.processes = int(os.getenv("RAG_INGEST_PROCESSES", str(min(4, os.cpu_count() or 1))))
     
     def load_docx(self, file_path):
         """Extract text from DOCX file"""
@@ -19,31 +34,97 @@ class DocumentLoader:
                 text.append(paragraph.text.strip())
         return "\n".join(text)
     
-    def load_all_documents(self):
-        """Load all DOCX files from documents folder"""
-        documents = []
+    def list_documents(self):
+        """DOCX filenames in the documents folder"""
+        return sorted(f for f in os.listdir(self.documents_folder) if f.endswith('.docx'))
+    
+    def _file_hash(self, file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def diff_documents(self, previous_state):
+        """Compare the documents folder against the state recorded at the last index build.
+        
+        Files whose mtime is unchanged are assumed unchanged; otherwise the content
+        hash decides, so a touched-but-identical file is not re-indexed.
+        Returns (changed, removed, current_state) where changed covers new files too.
+        """
+        changed = []
+        current_state = {}
+        
+        for filename in self.list_documents():
+            file_path = os.path.join(self.documents_folder, filename)
+            mtime = os.path.getmtime(file_path)
+            previous = previous_state.get(filename)
+            
+            if previous and previous['mtime'] == mtime:
+                current_state[filename] = previous
+                continue
+            
+            file_hash = self._file_hash(file_path)
+            current_state[filename] = {'mtime': mtime, 'hash': file_hash}
+            if not previous or previous['hash'] != file_hash:
+                changed.append(filename)
         
-        for filename in os.listdir(self.documents_folder):
-            if filename.endswith('.docx'):
-                file_path = os.path.join(self.documents_folder, filename)
-                text_content = self.load_docx(file_path)
-                
-                # Split into chunks
-                chunks = self.text_splitter.split_text(text_content)
-                
-                # Add metadata to each chunk
-                for i, chunk in enumerate(chunks):
-                    documents.append({
-                        'content': chunk,
-                        'source': filename,
-                        'chunk_id': f"{filename}_{i}",
-                        'metadata': {
-                            'source_file': filename,
-                            'chunk_index': i
-                        }
-                    })
+        removed = [filename for filename in previous_state if filename not in current_state]
+        return changed, removed, current_state
+    
+    def chunk_file(self, filename):
+        """Load and chunk a single DOCX file"""
+        file_path = os.path.join(self.documents_folder, filename)
+        text_content = self.load_docx(file_path)
+        
+        # Split into chunks
+        chunks = self.text_splitter.split_text(text_content)
+        
+        # Add metadata to each chunk
+        return [
+            {
+                'content': chunk,
+                'source': filename,
+                'chunk_id': f"{filename}_{i}",
+                'metadata': {
+                    'source_file': filename,
+                    'chunk_index': i
+                }
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+    
+    def iter_documents(self, filenames, processes=None):
+        """Yield chunks of the given DOCX files as each file is parsed.
+        
+        Files are parsed in a process pool with at most two files in flight per
+        worker, so memory stays bounded however large the corpus is. Chunks come
+        out in ``filenames`` order.
+        """
+        processes = processes or self.processes
+        if processes <= 1 or len(filenames) <= 1:
+            for filename in filenames:
+                yield from self.chunk_file(filename)
+            return
         
-        return documents
+        tasks = iter((self.documents_folder, f, self.chunk_size, self.chunk_overlap) for f in filenames)
+        # spawn, not fork: the parent may hold Flask threads
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            in_flight = deque()
+            for task in tasks:
+                in_flight.append(executor.submit(_load_file_chunks, task))
+                if len(in_flight) >= processes * 2:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+    
+    def load_documents(self, filenames):
+        """Load and chunk the given DOCX files"""
+        return list(self.iter_documents(filenames))
+    
+    def load_all_documents(self):
+        """Load all DOCX files from documents folder"""
+        return self.load_documents(self.list_documents())
 
 if __name__ == "__main__":
     loader = DocumentLoader()
@@ -0,0 +1,146 @@
+# embedding_cache.py
+
+import os
+import re
+import json
+import hashlib
+import threading
+import contextlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialised
+    fcntl = None
+
+
+class EmbeddingCache:
+    """Durable chunk-embedding cache keyed by content hash + model name.
+
+    Vectors are appended to a raw float32 file that is read back through a
+    memory map; a small JSON index maps each key to its row. Rebuilding the
+    RAG index then only pays the embedding API for new or changed chunks.
+
+    Several worker processes can share one cache directory: writes hold an
+    exclusive ``flock`` and reload the on-disk state before appending, and
+    readers pick up rows added by other processes.
+    """
+
+    def __init__(self, cache_dir="embedding_cache", model="models/text-embedding-004"):
+        self.model = model
+        os.makedirs(cache_dir, exist_ok=True)
+
+        safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        self.vectors_path = os.path.join(cache_dir, f"{safe_model}.f32")
+        self.index_path = os.path.join(cache_dir, f"{safe_model}.json")
+        self.lock_path = os.path.join(cache_dir, f"{safe_model}.lock")
+
+        self.dimension = None
+        self.rows = {}
+        self._row_count = 0
+        self._vectors = None
+        self._index_version = None
+        self._lock = threading.Lock()
+        with self._lock, self._file_lock(exclusive=False):
+            self._load()
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive):
+        """Cross-process lock on the cache files (shared for reads, exclusive for writes)"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _version(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _load(self):
+        """(Re)read the JSON index unless it is unchanged since the last load"""
+        version = self._version()
+        if version is None or version == self._index_version or not os.path.exists(self.vectors_path):
+            return
+
+        with open(self.index_path, "r") as f:
+            data = json.load(f)
+        self._index_version = version
+
+        self.dimension = data["dimension"]
+        # Ignore rows whose vectors never made it to disk (interrupted write)
+        rows_on_disk = os.path.getsize(self.vectors_path) // (self.dimension * 4)
+        self.rows = {key: row for key, row in data["rows"].items() if row < rows_on_disk}
+        self._row_count = min(rows_on_disk, max(self.rows.values(), default=-1) + 1)
+        self._vectors = None
+        print(f"Loaded embedding cache with {len(self.rows)} vectors")
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_vectors(self):
+        if self._vectors is None or len(self._vectors) < self._row_count:
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r",
+                shape=(self._row_count, self.dimension)
+            )
+        return self._vectors
+
+    def get_many(self, texts):
+        """Return cached embeddings aligned with ``texts`` (None on a miss)"""
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            if any(key not in self.rows for key in keys):
+                # Another worker may have added them since we last looked
+                with self._file_lock(exclusive=False):
+                    self._load()
+            if not self.rows:
+                return [None] * len(texts)
+
+            vectors = self._get_vectors()
+            results = []
+            for key in keys:
+                row = self.rows.get(key)
+                results.append(vectors[row].tolist() if row is not None else None)
+            return results
+
+    def put_many(self, texts, embeddings):
+        """Append new embeddings and persist the index; None embeddings are skipped"""
+        new_items = [(self._key(t), e) for t, e in zip(texts, embeddings) if e is not None]
+
+        with self._lock, self._file_lock(exclusive=True):
+            # Rows written by other workers decide where this batch starts
+            self._load()
+            new_items = [(key, e) for key, e in new_items if key not in self.rows]
+            if not new_items:
+                return
+
+            if self.dimension is None:
+                self.dimension = len(new_items[0][1])
+            new_items = [(key, e) for key, e in new_items if len(e) == self.dimension]
+
+            block = np.array([e for _, e in new_items], dtype=np.float32)
+            with open(self.vectors_path, "ab") as f:
+                # Append at the last complete row in case a previous write was cut short
+                f.truncate(self._row_count * self.dimension * 4)
+                f.write(block.tobytes())
+
+            for key, _ in new_items:
+                self.rows[key] = self._row_count
+                self._row_count += 1
+
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"model": self.model, "dimension": self.dimension, "rows": self.rows}, f)
+            os.replace(tmp_path, self.index_path)
+            self._index_version = self._version()
+
+    def __len__(self):
+        return len(self.rows)
@@ -2,11 +2,28 @@
 
 import os
 import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from dotenv import load_dotenv
+from embedding_cache import EmbeddingCache
 
 load_dotenv()
 
+# Gemini accepts at most 100 contents per batchEmbedContents call
+MAX_BATCH_SIZE = 100
+
+
+def _is_rate_limit_error(error):
+    message = str(error).lower()
+    return (
+        type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or "429" in message
+        or "quota" in message
+        or "rate limit" in message
+    )
+
 
 class EmbeddingGenerator:
     def __init__(self):
@@ -16,17 +33,34 @@ class EmbeddingGenerator:
 
         genai.configure(api_key=api_key)
         self.model = "models/text-embedding-004"
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "50"))
+        self.max_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+        # Chunk embeddings survive restarts so index rebuilds only embed new text
+        self.cache = None
+        if os.getenv("EMBEDDING_CACHE", "true").lower() == "true":
+            self.cache = EmbeddingCache(
+                cache_dir=os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache"),
+                model=self.model
+            )
 
-    def generate_embedding(self, text: str):
+        # Shared backoff so one 429 slows every in-flight batch, not just its own
+        self._backoff_until = 0.0
+        self._backoff_delay = 0.0
+        self._backoff_lock = threading.Lock()
+
+    def generate_embedding(self, text: str, task_type="retrieval_document"):
         """Generate embedding for a single document chunk"""
         if not text or not text.strip():
             return None
 
         try:
+            self._wait_for_backoff()
             result = genai.embed_content(
                 model=self.model,
                 content=text,
-                task_type="retrieval_document"
+                task_type=task_type
             )
             return result["embedding"]
 
@@ -34,25 +68,89 @@ class EmbeddingGenerator:
             print(f"[Embedding Error] {e}")
             return None
 
-    def generate_embeddings_batch(self, texts, batch_size=5):
-        """Generate embeddings for multiple text chunks"""
-        embeddings = []
-        
-        print(f"Generating embeddings for {len(texts)} texts...")
-
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-
-            for text in batch:
-                embedding = self.generate_embedding(text)
-                if embedding:
-                    embeddings.append(embedding)
-                else:
-                    print(f"Failed to generate embedding for text: {text[:50]}...")
-
-                time.sleep(0.15)  # Gemini rate-limit safety
-
-            print(f"Embedded {len(embeddings)} / {len(texts)} chunks")
+    def _wait_for_backoff(self):
+        with self._backoff_lock:
+            delay = self._backoff_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _register_rate_limit(self):
+        with self._backoff_lock:
+            self._backoff_delay = min(max(self._backoff_delay * 2, 1.0), 60.0)
+            delay = self._backoff_delay + random.uniform(0, self._backoff_delay / 2)
+            self._backoff_until = max(self._backoff_until, time.time() + delay)
+        print(f"[Embedding] Rate limited, backing off {delay:.1f}s")
+
+    def _register_success(self):
+        with self._backoff_lock:
+            self._backoff_delay = self._backoff_delay / 2 if self._backoff_delay > 1.0 else 0.0
+
+    def _embed_batch(self, batch, task_type="retrieval_document"):
+        """Embed one batch in a single API call, retrying on rate limits"""
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_backoff()
+            try:
+                result = genai.embed_content(
+                    model=self.model,
+                    content=batch,
+                    task_type=task_type
+                )
+                embeddings = result["embedding"]
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                self._register_success()
+                return embeddings
+
+            except Exception as e:
+                if _is_rate_limit_error(e) and attempt < self.max_retries:
+                    self._register_rate_limit()
+                    continue
+
+                # Embed one by one so a single bad chunk doesn't fail its neighbours
+                print(f"[Embedding Error] Batch of {len(batch)} failed ({e}), retrying individually")
+                return [self.generate_embedding(text, task_type) for text in batch]
+
+    def generate_embeddings_batch(self, texts, batch_size=None):
+        """Generate embeddings for multiple text chunks.
+
+        Returns a list aligned with ``texts``: position i holds the embedding
+        for texts[i], or None if that text is empty or could not be embedded.
+        """
+        batch_size = min(batch_size or self.batch_size, MAX_BATCH_SIZE)
+        embeddings = [None] * len(texts)
+
+        # Empty chunks are skipped but keep their slot
+        positions = [i for i, text in enumerate(texts) if text and text.strip()]
+
+        if self.cache is not None:
+            cached = self.cache.get_many([texts[i] for i in positions])
+            for i, embedding in zip(positions, cached):
+                embeddings[i] = embedding
+            hits = sum(1 for embedding in cached if embedding is not None)
+            print(f"Embedding cache: {hits} hits, {len(positions) - hits} to embed")
+            positions = [i for i in positions if embeddings[i] is None]
+
+        batches = [positions[i:i + batch_size] for i in range(0, len(positions), batch_size)]
+
+        print(f"Generating embeddings for {len(texts)} texts in {len(batches)} batches...")
+
+        def embed_positions(batch_positions):
+            return batch_positions, self._embed_batch([texts[i] for i in batch_positions])
+
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as executor:
+            for batch_positions, batch_embeddings in executor.map(embed_positions, batches):
+                for position, embedding in zip(batch_positions, batch_embeddings):
+                    embeddings[position] = embedding
+                completed += len(batch_positions)
+                print(f"Embedded {completed} / {len(positions)} chunks")
+
+                if self.cache is not None:
+                    self.cache.put_many([texts[i] for i in batch_positions], batch_embeddings)
+
+        failed = sum(1 for i in positions if embeddings[i] is None)
+        if failed:
+            print(f"Failed to generate embeddings for {failed} texts")
 
         return embeddings
 
@@ -72,3 +170,19 @@ class EmbeddingGenerator:
         except Exception as e:
             print(f"[Query Embedding Error] {e}")
             return None
+
+    def generate_query_embeddings_batch(self, queries):
+        """Embed many user queries with batched API calls; aligned with ``queries`` (None on failure)"""
+        embeddings = [None] * len(queries)
+        positions = [i for i, query in enumerate(queries) if query and query.strip()]
+
+        for start in range(0, len(positions), MAX_BATCH_SIZE):
+            batch_positions = positions[start:start + MAX_BATCH_SIZE]
+            batch_embeddings = self._embed_batch(
+                [queries[i] for i in batch_positions],
+                task_type="retrieval_query"
+            )
+            for position, embedding in zip(batch_positions, batch_embeddings):
+                embeddings[position] = embedding
+
+        return embeddings
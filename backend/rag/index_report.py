@@ -0,0 +1,123 @@
+# index_report.py
+"""Recall-vs-latency report for the approximate index types, measured against exact search.
+
+Run from backend/ after the RAG index has been built:
+
+    python rag/index_report.py --k 5 --queries 200
+
+Corpus vectors come from the saved index; queries come from the persisted
+query-embedding cache when it exists, otherwise from perturbed corpus vectors.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from vector_store import VectorStore
+
+SEARCH_GRID = {
+    "ivf": [1, 2, 4, 8, 16, 32],
+    "ivfsq8": [1, 2, 4, 8, 16, 32],
+    "ivfpq": [1, 2, 4, 8, 16, 32],
+    "hnsw": [16, 32, 64, 128, 256]
+}
+
+
+def load_queries(corpus, n_queries, query_cache_path):
+    if query_cache_path and os.path.exists(query_cache_path):
+        vectors = np.load(query_cache_path, allow_pickle=False)["vectors"].astype(np.float32)
+        if len(vectors) and vectors.shape[1] == corpus.shape[1]:
+            print(f"Using {min(len(vectors), n_queries)} cached query embeddings")
+            return vectors[:n_queries]
+
+    print(f"Using {n_queries} perturbed corpus vectors as queries")
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(corpus), size=n_queries, replace=len(corpus) < n_queries)
+    return corpus[rows] + rng.normal(0, 0.05, size=(n_queries, corpus.shape[1])).astype(np.float32)
+
+
+def measure(index, queries, k, ground_truth):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(ids[0]) & set(expected))
+
+    return {
+        "recall": round(hits / (k * len(queries)), 4),
+        "mean_ms": round(float(np.mean(latencies)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4)
+    }
+
+
+def run_report(store, queries, k, index_types):
+    ids, corpus = store.get_vectors()
+    if not store._is_flat():
+        print("Warning: the saved index is not flat, ground truth uses its reconstructed vectors")
+
+    faiss.normalize_L2(queries)
+    exact = faiss.IndexIDMap2(faiss.IndexFlatIP(corpus.shape[1]))
+    exact.add_with_ids(corpus, ids)
+    ground_truth = exact.search(queries, k)[1]
+
+    rows = [{"index": "flat", "param": "-", "build_s": 0.0,
+             "bytes": len(faiss.serialize_index(exact)), **measure(exact, queries, k, ground_truth)}]
+
+    for index_type in index_types:
+        candidate = VectorStore(index_path=None, metadata_path=None, index_type=index_type)
+        candidate.dimension = corpus.shape[1]
+
+        start = time.perf_counter()
+        candidate.index = candidate._new_index(corpus)
+        candidate.index.add_with_ids(corpus, ids)
+        build_s = round(time.perf_counter() - start, 3)
+        size = len(faiss.serialize_index(candidate.index))
+
+        knob = "ef_search" if index_type == "hnsw" else "nprobe"
+        for value in SEARCH_GRID[index_type]:
+            candidate.set_search_params(**{knob: value})
+            rows.append({"index": index_type, "param": f"{knob}={value}", "build_s": build_s,
+                         "bytes": size, **measure(candidate.index, queries, k, ground_truth)})
+
+    return rows
+
+
+def print_report(rows, k):
+    print(f"\n{'index':<8} {'param':<14} {'recall@' + str(k):>9} {'mean ms':>9} {'p95 ms':>9} {'build s':>8} {'MB':>8}")
+    for row in rows:
+        print(f"{row['index']:<8} {row['param']:<14} {row['recall']:>9.4f} {row['mean_ms']:>9.4f} "
+              f"{row['p95_ms']:>9.4f} {row['build_s']:>8.3f} {row['bytes'] / 1e6:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index", default="rag_index.faiss")
+    parser.add_argument("--metadata", default="rag_metadata.jsonl")
+    parser.add_argument("--query-cache", default=os.getenv("QUERY_EMBEDDING_CACHE_PATH", "query_embedding_cache.npz"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", default="ivf,ivfsq8,ivfpq,hnsw")
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    store = VectorStore(args.index, args.metadata, mmap=False)
+    if not store.load_index():
+        sys.exit("No saved RAG index found, build it first")
+
+    _, corpus = store.get_vectors()
+    queries = load_queries(corpus, args.queries, args.query_cache)
+    rows = run_report(store, queries, args.k, [t for t in args.types.split(",") if t])
+    print_report(rows, args.k)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
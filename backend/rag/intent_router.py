@@ -0,0 +1,197 @@
+# intent_router.py
+
+import os
+import re
+import math
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+from lexical_index import tokenize, IDENTIFIER_PATTERN
+
+load_dotenv()
+
+POLICY_RAG = "policy_rag"
+ACCOUNT_LOOKUP = "account_lookup"
+COMPLAINT_STATUS = "complaint_status"
+# No confident route: the message goes to the full LLM agent
+GENERAL = "general"
+# Greetings and small talk the assistant can answer without any lookup
+OUT_OF_SCOPE = "out_of_scope"
+
+# Regex fragments matched at a word start, so "refund" also covers "refunds"/"refunded";
+# a space matches any run of whitespace
+INTENT_KEYWORDS = {
+    POLICY_RAG: [
+        'polic(?:y|ies)', 'procedure', 'process', 'requirements', 'rules', 'guidelines',
+        'refund', 'reversal', 'categories', 'types', 'delayed', 'partial', 'duplicate',
+        'failed', 'authentication', 'security', 'compliance', 'regulatory', 'rbi', 'sla',
+        'otp', 'phishing', 'fraud', 'unauthori[sz]ed', 'lockout', 'limit', 'kyc', 'verification',
+        'account', 'transaction', 'transfer', 'payment', 'deposit', 'withdrawal', 'loan',
+        'credit', 'issue', 'bank', 'complaint', 'grievance', 'dispute', 'card', 'atm',
+        r'pin\b', 'password', 'net ?banking', 'upi', 'neft', 'rtgs', 'imps', 'cheque',
+        'hack', 'deduct', 'debit', 'error',
+        # Bare error codes and section numbers ("What is U20?") are policy lookups too
+        rf'(?:{IDENTIFIER_PATTERN})\b'
+    ],
+    ACCOUNT_LOOKUP: [
+        'balance', 'account balance', 'account number', 'account details', 'account info',
+        'account type', 'my transactions', 'transaction history', 'recent transactions',
+        r'(?:last|latest|recent) (?:\d+ )?(?:transactions?|payments?)', 'statement',
+        'my kyc', 'kyc status', 'verification status', 'how much money', 'how much do i have'
+    ],
+    COMPLAINT_STATUS: [
+        'my complaints?', r'complaint (?:status|id|number|#?\d+)', 'my ticket', 'ticket status',
+        r'status of (?:my|the) (?:\w+ )?(?:complaint|ticket|dispute|grievance)',
+        '(?:grievance|dispute|escalation) status'
+    ]
+}
+
+# Breaks ties between intents with the same number of keyword hits; account lookup
+# comes last so a generic policy question mentioning a balance stays with RAG
+INTENT_PRIORITY = [COMPLAINT_STATUS, POLICY_RAG, ACCOUNT_LOOKUP]
+
+# Seed utterances for the optional nearest-centroid fallback classifier
+INTENT_EXAMPLES = {
+    POLICY_RAG: [
+        "money debited but not received by the beneficiary",
+        "how long does it take to get money back",
+        "what should I do if I shared my pin or password",
+        "charges and timelines for neft rtgs imps upi transfers"
+    ],
+    ACCOUNT_LOOKUP: [
+        "how much money do I have left",
+        "show what I spent recently",
+        "what did I pay last week",
+        "my savings and current funds"
+    ],
+    COMPLAINT_STATUS: [
+        "has my reported problem been resolved yet",
+        "any update on the problem I raised",
+        "is my grievance still open or closed"
+    ]
+}
+
+# Whole-message greetings and pleasantries; anything else unmatched is GENERAL
+SMALL_TALK_PATTERN = re.compile(
+    r"(?:\s*(?:hi|hello|hey|hiya|good (?:morning|afternoon|evening)|thanks?|thank you|"
+    r"ok(?:ay)?|bye|goodbye|how are you|who are you|what can you do|help)"
+    r"(?: there| so much| a lot| again)?[\s!.?,]*)+",
+    re.IGNORECASE
+)
+
+# Questions about the user's own data ("my transfer", "my account") need the agent's tools
+PERSONAL_PATTERN = re.compile(r"\b(?:my|mine|our)\b", re.IGNORECASE)
+
+
+class RouteResult:
+    def __init__(self, intent, matches=None, confidence=1.0, method="keywords", personal=False):
+        self.intent = intent
+        self.matches = matches or {}
+        self.confidence = confidence
+        self.method = method
+        self.personal = personal
+
+    @property
+    def is_banking(self):
+        return self.intent not in (OUT_OF_SCOPE, GENERAL)
+
+    def to_dict(self):
+        return {
+            'intent': self.intent,
+            'matches': self.matches,
+            'confidence': round(self.confidence, 4),
+            'method': self.method,
+            'personal': self.personal
+        }
+
+
+class IntentRouter:
+    """Routes a chat message to policy RAG, account lookup, complaint status, small talk
+    (out of scope) or, when none of those is a confident match, the general agent.
+
+    All keyword fragments are compiled into one regex alternation (longest
+    first, one named group each), so a message is scanned once however many
+    keywords there are.
+    The intent with the most hits wins. Messages with no keyword hit can
+    optionally fall back to a bag-of-words nearest-centroid classifier built
+    from INTENT_EXAMPLES.
+    """
+
+    def __init__(self, keywords=None, examples=None, use_classifier=None, classifier_threshold=None):
+        keywords = keywords or INTENT_KEYWORDS
+        fragments = sorted(
+            ((fragment, intent) for intent, fragment_list in keywords.items() for fragment in fragment_list),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self._group_intents = {f"k{i}": intent for i, (_, intent) in enumerate(fragments)}
+        alternation = "|".join(
+            f"(?P<k{i}>{fragment})".replace(" ", r"\s+") for i, (fragment, _) in enumerate(fragments)
+        )
+        self._pattern = re.compile(rf"\b(?:{alternation})", re.IGNORECASE)
+
+        if use_classifier is None:
+            use_classifier = os.getenv("INTENT_CLASSIFIER", "true").lower() == "true"
+        self.classifier_threshold = classifier_threshold if classifier_threshold is not None else float(
+            os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.4")
+        )
+        self._centroids = self._build_centroids(examples or INTENT_EXAMPLES) if use_classifier else {}
+
+    def _vector(self, text):
+        counts = Counter(tokenize(text))
+        norm = math.sqrt(sum(v * v for v in counts.values()))
+        return {t: v / norm for t, v in counts.items()} if norm else {}
+
+    def _build_centroids(self, examples):
+        centroids = {}
+        for intent, utterances in examples.items():
+            total = Counter()
+            for utterance in utterances:
+                total.update(self._vector(utterance))
+            norm = math.sqrt(sum(v * v for v in total.values()))
+            centroids[intent] = {t: v / norm for t, v in total.items()}
+        return centroids
+
+    def _classify(self, text):
+        vector = self._vector(text)
+        best_intent, best_score = None, 0.0
+        for intent, centroid in self._centroids.items():
+            score = sum(weight * centroid.get(token, 0.0) for token, weight in vector.items())
+            if score > best_score:
+                best_intent, best_score = intent, score
+        return best_intent, best_score
+
+    def route(self, text):
+        personal = bool(PERSONAL_PATTERN.search(text))
+        matches = {}
+        for match in self._pattern.finditer(text):
+            intent = self._group_intents[match.lastgroup]
+            matches.setdefault(intent, []).append(match.group(0).lower())
+
+        if matches:
+            intent = max(INTENT_PRIORITY, key=lambda i: (len(matches.get(i, [])), -INTENT_PRIORITY.index(i)))
+            return RouteResult(intent, matches, personal=personal)
+
+        if SMALL_TALK_PATTERN.fullmatch(text):
+            return RouteResult(OUT_OF_SCOPE, method="small_talk", personal=personal)
+
+        if self._centroids:
+            intent, score = self._classify(text)
+            if intent and score >= self.classifier_threshold:
+                return RouteResult(intent, matches, confidence=score, method="classifier", personal=personal)
+
+        return RouteResult(GENERAL, matches, confidence=0.0, method="fallback", personal=personal)
+
+
+# Shared router; the compiled pattern is immutable so every thread can use it
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
@@ -0,0 +1,121 @@
+# lexical_index.py
+
+import re
+import math
+import threading
+from collections import Counter, defaultdict
+
+# Keeps error codes ("U20") and section numbers ("4.2.1") as single tokens
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)*')
+
+# Identifiers worth an exact lookup: error codes mixing letters and digits ("u20", "s31")
+# and dotted section numbers ("4.2.1"). Plain numbers ("7", "2025") and ordinals are not.
+IDENTIFIER_PATTERN = (
+    r'(?![0-9]+(?:st|nd|rd|th)\b)(?:[a-z]+[0-9]|[0-9]+[a-z])[a-z0-9]*(?:\.[0-9]+)*'
+    r'|[0-9]+(?:\.[0-9]+)+'
+)
+_IDENTIFIER_RE = re.compile(IDENTIFIER_PATTERN, re.IGNORECASE)
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for',
+    'from', 'how', 'i', 'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or',
+    'the', 'this', 'to', 'was', 'what', 'when', 'where', 'which', 'why', 'with',
+    'you', 'your'
+}
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def is_identifier(token):
+    return bool(_IDENTIFIER_RE.fullmatch(token))
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over RAG chunks, keyed by FAISS id"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # term -> {faiss_id: term frequency}
+        self._doc_lengths = {}
+        self._sources = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def add(self, items):
+        """Index (faiss_id, doc) pairs, replacing any chunk already indexed under the same id"""
+        with self._lock:
+            for faiss_id, doc in items:
+                if faiss_id in self._doc_lengths:
+                    self.remove([faiss_id])
+                terms = Counter(tokenize(doc['content']))
+                for term, tf in terms.items():
+                    self._postings[term][faiss_id] = tf
+                length = sum(terms.values())
+                self._doc_lengths[faiss_id] = length
+                self._sources[faiss_id] = doc['source']
+                self._total_length += length
+
+    def remove(self, faiss_ids):
+        with self._lock:
+            faiss_ids = set(faiss_ids) & set(self._doc_lengths)
+            if not faiss_ids:
+                return
+            for term in list(self._postings):
+                postings = self._postings[term]
+                for faiss_id in faiss_ids & postings.keys():
+                    del postings[faiss_id]
+                if not postings:
+                    del self._postings[term]
+            for faiss_id in faiss_ids:
+                self._total_length -= self._doc_lengths.pop(faiss_id)
+                del self._sources[faiss_id]
+
+    def remove_sources(self, sources):
+        sources = set(sources)
+        with self._lock:
+            self.remove([i for i, source in self._sources.items() if source in sources])
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_lengths.clear()
+            self._sources.clear()
+            self._total_length = 0
+
+    def __contains__(self, term):
+        return term in self._postings
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def search(self, query, k=5, required_terms=None):
+        """Top-k (faiss_id, score) pairs; with ``required_terms`` only chunks containing one of them"""
+        terms = tokenize(query)
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if not n_docs or not terms:
+                return []
+
+            avg_length = self._total_length / n_docs
+            allowed = None
+            if required_terms:
+                allowed = set()
+                for term in required_terms:
+                    allowed.update(self._postings.get(term, {}))
+
+            scores = defaultdict(float)
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for faiss_id, tf in postings.items():
+                    if allowed is not None and faiss_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[faiss_id] / avg_length)
+                    scores[faiss_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
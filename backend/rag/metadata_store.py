@@ -0,0 +1,130 @@
+# metadata_store.py
+
+import os
+import json
+import mmap
+import numpy as np
+
+
+class MetadataStore:
+    """Read-mostly chunk metadata, decoded lazily by FAISS id.
+
+    On disk the metadata is a JSON-lines file (line 0 is a header with the
+    embedding dimension and document state, then one chunk per line) plus a
+    ``.idx.npy`` table of (id, offset, length) rows sorted by id. Both are
+    memory-mapped, so every worker shares the same page-cache copy and only the
+    chunks a search returns are ever decoded. Incremental updates go into an
+    in-memory overlay until the next save().
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.header = {}
+        self._table = np.empty((0, 3), dtype=np.int64)
+        self._file = None
+        self._data = None
+        self._added = {}
+        self._deleted = set()
+
+        if path:
+            self._open(path)
+
+    @staticmethod
+    def index_path(path):
+        return path + ".idx.npy"
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(path) and os.path.exists(cls.index_path(path))
+
+    def _open(self, path):
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.header = json.loads(self._data.readline())
+        self._table = np.load(self.index_path(path), mmap_mode="r")
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def copy(self):
+        """A store sharing the on-disk data whose overlay can be changed independently"""
+        other = MetadataStore()
+        other.path = self.path
+        other.header = self.header
+        other._table = self._table
+        other._file = self._file
+        other._data = self._data
+        other._added = dict(self._added)
+        other._deleted = set(self._deleted)
+        return other
+
+    def _row(self, faiss_id):
+        ids = self._table[:, 0]
+        row = int(np.searchsorted(ids, faiss_id))
+        if row < len(ids) and ids[row] == faiss_id:
+            return row
+        return None
+
+    def _read(self, row):
+        _, offset, length = self._table[row]
+        return json.loads(self._data[int(offset):int(offset) + int(length)])
+
+    def __getitem__(self, faiss_id):
+        if faiss_id in self._added:
+            return self._added[faiss_id]
+        if faiss_id not in self._deleted:
+            row = self._row(faiss_id)
+            if row is not None:
+                return self._read(row)
+        raise KeyError(faiss_id)
+
+    def __setitem__(self, faiss_id, doc):
+        self._deleted.discard(faiss_id)
+        self._added[faiss_id] = doc
+
+    def __delitem__(self, faiss_id):
+        if faiss_id not in self:
+            raise KeyError(faiss_id)
+        self._added.pop(faiss_id, None)
+        self._deleted.add(faiss_id)
+
+    def __contains__(self, faiss_id):
+        if faiss_id in self._added:
+            return True
+        return faiss_id not in self._deleted and self._row(faiss_id) is not None
+
+    def keys(self):
+        for faiss_id in self._table[:, 0]:
+            faiss_id = int(faiss_id)
+            if faiss_id not in self._deleted and faiss_id not in self._added:
+                yield faiss_id
+        yield from list(self._added)
+
+    def items(self):
+        for faiss_id in self.keys():
+            yield faiss_id, self[faiss_id]
+
+    def __len__(self):
+        return sum(1 for _ in self.keys())
+
+    @classmethod
+    def write(cls, path, items, header):
+        """Write ``items`` ((faiss_id, doc) pairs) to ``path``; returns the tmp paths to swap in"""
+        rows = []
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for faiss_id, doc in sorted(items, key=lambda item: item[0]):
+                line = json.dumps(doc).encode("utf-8")
+                rows.append((faiss_id, f.tell(), len(line)))
+                f.write(line + b"\n")
+
+        tmp_index_path = cls.index_path(path) + ".tmp.npy"
+        np.save(tmp_index_path, np.array(rows, dtype=np.int64).reshape(-1, 3))
+        return tmp_path, tmp_index_path
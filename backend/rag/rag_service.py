@@ -2,66 +2,105 @@ import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 from retriever import Retriever
+from semantic_cache import SemanticCache
+from cache import create_cache
+from single_flight import SingleFlight
+from intent_router import get_intent_router
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import json
 import time
 
 load_dotenv()
 
+# Upper bound on client-requested generation concurrency for batch queries
+MAX_BATCH_CONCURRENCY = 16
+
 class RAGService:
-    def __init__(self):
+    def __init__(self, retriever=None, model=None):
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.retriever = Retriever()
-        self.response_cache = {}  # Simple in-memory cache
+        self.model = model or genai.GenerativeModel('gemini-2.5-flash')
+        self.retriever = retriever or Retriever()
+        # Bounded LRU+TTL cache; RAG_CACHE_BACKEND=sqlite/redis shares it across workers
+        self.response_cache = create_cache(
+            'rag_responses',
+            max_size=int(os.getenv("RAG_RESPONSE_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("RAG_RESPONSE_CACHE_TTL", "3600")),
+            max_bytes=int(os.getenv("RAG_RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        )
+        # Paraphrased questions reuse an earlier answer instead of calling Gemini again
+        self.semantic_cache_enabled = os.getenv("SEMANTIC_CACHE", "true").lower() != "false"
+        self.semantic_cache = SemanticCache(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "500")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        )
+        # Concurrent identical questions share one retrieval + Gemini call
+        self.inflight = SingleFlight(timeout=float(os.getenv("RAG_COALESCE_TIMEOUT", "60")))
+        # Parallel Gemini calls per /query/batch request
+        self.batch_concurrency = int(os.getenv("RAG_BATCH_CONCURRENCY", "4"))
         print("RAG Service initialized successfully")
 
     def is_banking_query(self, query):
-        banking_keywords = [
-            'kyc', 'account', 'transaction', 'transfer', 'refund', 'reversal',
-            'authentication', 'security', 'compliance', 'bank', 'policy',
-            'payment', 'deposit', 'withdrawal', 'balance', 'loan',
-            'credit', 'procedure', 'process', 'requirements', 'issue',
-            'delayed', 'partial', 'duplicate', 'failed', 'categories'
-        ]
-        query_lower = query.lower()
-        return any(word in query_lower for word in banking_keywords)
+        return get_intent_router().route(query).is_banking
 
-    def query(self, user_question):
+    def query(self, user_question, use_cache=True):
         print(f"RAG Query received: {user_question}")
         
         if not self.is_banking_query(user_question):
-            return {
-                'answer': "I can assist only with banking and policy-related questions.",
-                'has_context': False,
-                'sources': []
-            }
+            return self._off_topic_response()
 
-        return self.generate_response(user_question)
+        return self.generate_response(user_question, use_cache=use_cache)
     
-    def generate_response(self, query):
-        try:
-            # Check cache first
-            cache_key = hashlib.md5(query.lower().encode()).hexdigest()
-            if cache_key in self.response_cache:
-                cached_response = self.response_cache[cache_key]
-                if time.time() - cached_response['timestamp'] < 3600:  # 1 hour cache
-                    print("Using cached response")
-                    return cached_response['response']
-            
-            print(f"Getting context for query: {query}")
-            context = self.retriever.get_context(query)
-            print(f"Retrieved context length: {len(context) if context else 0}")
-            
-            if not context:
-                print("No context found, using general knowledge")
-                return {
-                    'answer': "I don't have specific information about that in our policy documents. Let me provide general banking guidance.",
-                    'has_context': False,
-                    'sources': []
-                }
-            
-            prompt = f"""You are a banking assistant for BankSecure AI. Answer the question based ONLY on the policy documents provided below.
+    def _off_topic_response(self):
+        return {
+            'answer': "I can assist only with banking and policy-related questions.",
+            'has_context': False,
+            'sources': []
+        }
+    
+    def clear_cache(self):
+        """Drop cached answers, e.g. after the policy documents changed"""
+        self.response_cache.clear()
+        self.semantic_cache.clear()
+    
+    def generate_response(self, query, use_cache=True):
+        cache_key = hashlib.md5(query.lower().encode()).hexdigest()
+        if not use_cache:
+            return self._generate_response(query, cache_key, use_cache)
+        return self.inflight.do(cache_key, lambda: self._generate_response(query, cache_key, use_cache))
+    
+    def _check_cache(self, query, cache_key):
+        """Return (cached_response, query_embedding); the embedding is reused for caching on a miss"""
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            print("Using cached response")
+            return cached_response, None
+        
+        return self._semantic_lookup(query)
+    
+    def _semantic_lookup(self, query):
+        query_embedding = None
+        # Lookups like "U20" vs "U30" embed almost identically; only exact-match those
+        if self.semantic_cache_enabled and not self.retriever.lexical_lookup_terms(query):
+            # Same embedding the retriever needs, so a miss costs no extra API call
+            query_embedding = self.retriever.get_query_embedding(query)
+            if query_embedding:
+                match = self.semantic_cache.lookup(query_embedding)
+                if match:
+                    response, score, cached_query = match
+                    print(f"Using semantically cached response (score: {score:.3f}, cached query: {cached_query})")
+                    return response, query_embedding
+        
+        return None, query_embedding
+    
+    def _cache_response(self, query, cache_key, query_embedding, result):
+        self.response_cache.set(cache_key, result)
+        if query_embedding:
+            self.semantic_cache.add(query, query_embedding, result)
+    
+    def _build_prompt(self, context, query):
+        return f"""You are a banking assistant for BankSecure AI. Answer the question based ONLY on the policy documents provided below.
 
 Policy Document Context:
 {context}
@@ -76,35 +115,205 @@ Instructions:
 5. If the documents don't contain enough information, say so clearly
 
 Answer:"""
-            
-            print("Generating LLM response with document context")
-            response = self.model.generate_content(prompt)
-            
-            result = {
-                'answer': response.text,
+    
+    def _no_context_response(self):
+        print("No context found, using general knowledge")
+        return {
+            'answer': "I don't have specific information about that in our policy documents. Let me provide general banking guidance.",
+            'has_context': False,
+            'sources': []
+        }
+    
+    def _error_response(self, context):
+        # Return a helpful response with the context even if LLM fails
+        if context:
+            return {
+                'answer': f"I found relevant information in our policy documents about your query, but I'm experiencing technical difficulties generating a response. Here's the relevant policy content:\n\n{context[:500]}...",
                 'has_context': True,
                 'sources': ['BankSecure AI Policy Documents']
             }
+        return {
+            'answer': "I'm having trouble accessing the policy information right now. Please try again.",
+            'has_context': False,
+            'sources': []
+        }
+    
+    def _generate_response(self, query, cache_key, use_cache):
+        context = None
+        try:
+            # Check cache first
+            query_embedding = None
+            if use_cache:
+                cached_response, query_embedding = self._check_cache(query, cache_key)
+                if cached_response is not None:
+                    return cached_response
+            
+            print(f"Getting context for query: {query}")
+            context = self.retriever.get_context(query)
+            print(f"Retrieved context length: {len(context) if context else 0}")
+            
+            if not context:
+                return self._no_context_response()
+            
+            result = self._generate_answer(query, context)
             
             # Cache the response
-            self.response_cache[cache_key] = {
-                'response': result,
-                'timestamp': time.time()
-            }
+            self._cache_response(query, cache_key, query_embedding, result)
             
             return result
             
         except Exception as e:
             print(f"Error in RAG generation: {e}")
-            # Return a helpful response with the context even if LLM fails
-            if 'context' in locals() and context:
-                return {
-                    'answer': f"I found relevant information in our policy documents about your query, but I'm experiencing technical difficulties generating a response. Here's the relevant policy content:\n\n{context[:500]}...",
-                    'has_context': True,
-                    'sources': ['BankSecure AI Policy Documents']
-                }
-            return {
-                'answer': "I'm having trouble accessing the policy information right now. Please try again.",
-                'has_context': False,
-                'sources': []
+            return self._error_response(context)
+    
+    def _generate_answer(self, query, context):
+        print("Generating LLM response with document context")
+        response = self.model.generate_content(self._build_prompt(context, query))
+        return {
+            'answer': response.text,
+            'has_context': True,
+            'sources': ['BankSecure AI Policy Documents']
+        }
+    
+    def query_batch(self, questions, use_cache=True, max_concurrency=None):
+        """Answer many questions at once.
+        
+        Uncached questions are embedded in batched calls and searched with one FAISS
+        matrix search; Gemini generation then fans out over at most
+        ``max_concurrency`` threads. Returns per-question results and timings.
+        """
+        start = time.time()
+        results = [None] * len(questions)
+        cache_keys = [hashlib.md5(q.lower().encode()).hexdigest() for q in questions]
+        
+        pending = []
+        first_seen = {}
+        duplicates = []
+        for i, question in enumerate(questions):
+            if not self.is_banking_query(question):
+                results[i] = dict(self._off_topic_response(), cache=None)
+                continue
+            if cache_keys[i] in first_seen:
+                # Repeated question in the same batch: answered once, copied below
+                duplicates.append((i, first_seen[cache_keys[i]]))
+                continue
+            first_seen[cache_keys[i]] = i
+            cached_response = self.response_cache.get(cache_keys[i]) if use_cache else None
+            if cached_response is not None:
+                results[i] = dict(cached_response, cache='exact')
+            else:
+                pending.append(i)
+        
+        retrieval_start = time.time()
+        retrieved = self.retriever.retrieve_batch([questions[i] for i in pending], k=self.retriever.context_candidates) if pending else []
+        retrieval_ms = (time.time() - retrieval_start) * 1000
+        
+        to_generate = []
+        for i, retrieved_results in zip(pending, retrieved):
+            query_embedding = None
+            if use_cache:
+                # Query embeddings were cached by retrieve_batch, so this makes no API call
+                cached_response, query_embedding = self._semantic_lookup(questions[i])
+                if cached_response is not None:
+                    results[i] = dict(cached_response, cache='semantic')
+                    continue
+            context = self.retriever.build_context(retrieved_results)
+            if not context:
+                results[i] = dict(self._no_context_response(), cache=None)
+            else:
+                to_generate.append((i, context, query_embedding))
+        
+        def generate(item):
+            i, context, query_embedding = item
+            generation_start = time.time()
+            try:
+                result = self._generate_answer(questions[i], context)
+                self._cache_response(questions[i], cache_keys[i], query_embedding, result)
+            except Exception as e:
+                print(f"Error in RAG batch generation: {e}")
+                result = self._error_response(context)
+            return i, dict(result, cache=None, generation_ms=round((time.time() - generation_start) * 1000, 1))
+        
+        generation_start = time.time()
+        workers = max(1, min(int(max_concurrency or self.batch_concurrency), MAX_BATCH_CONCURRENCY, len(to_generate) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i, result in executor.map(generate, to_generate):
+                results[i] = result
+        
+        for i, original in duplicates:
+            results[i] = dict(results[original], cache='duplicate', generation_ms=0.0)
+        
+        for question, result in zip(questions, results):
+            result['question'] = question
+            result.setdefault('generation_ms', 0.0)
+        
+        return {
+            'results': results,
+            'timings': {
+                'retrieval_ms': round(retrieval_ms, 1),
+                'generation_ms': round((time.time() - generation_start) * 1000, 1),
+                'total_ms': round((time.time() - start) * 1000, 1)
+            }
+        }
+    
+    def query_stream(self, user_question, use_cache=True):
+        """Streaming counterpart of query(); yields events from stream_response()"""
+        print(f"RAG streaming query received: {user_question}")
+        
+        if not self.is_banking_query(user_question):
+            yield {'type': 'token', 'text': self._off_topic_response()['answer']}
+            yield {'type': 'done', 'has_context': False, 'sources': []}
+            return
+        
+        yield from self.stream_response(user_question, use_cache=use_cache)
+    
+    def stream_response(self, query, use_cache=True):
+        """Yield the answer as Gemini produces it.
+        
+        Events are dicts: {'type': 'token', 'text': ...} for each piece of the answer,
+        then {'type': 'done', 'has_context': ..., 'sources': [...]}. Cached answers are
+        sent as a single token. The completed answer is cached like generate_response.
+        """
+        cache_key = hashlib.md5(query.lower().encode()).hexdigest()
+        context = None
+        parts = []
+        try:
+            query_embedding = None
+            if use_cache:
+                cached_response, query_embedding = self._check_cache(query, cache_key)
+                if cached_response is not None:
+                    yield {'type': 'token', 'text': cached_response['answer']}
+                    yield {'type': 'done', 'has_context': cached_response['has_context'], 'sources': cached_response['sources']}
+                    return
+            
+            context = self.retriever.get_context(query)
+            if not context:
+                result = self._no_context_response()
+                yield {'type': 'token', 'text': result['answer']}
+                yield {'type': 'done', 'has_context': False, 'sources': []}
+                return
+            
+            print("Streaming LLM response with document context")
+            for chunk in self.model.generate_content(self._build_prompt(context, query), stream=True):
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    yield {'type': 'token', 'text': text}
+            
+            result = {
+                'answer': ''.join(parts),
+                'has_context': True,
+                'sources': ['BankSecure AI Policy Documents']
             }
+            self._cache_response(query, cache_key, query_embedding, result)
+            yield {'type': 'done', 'has_context': True, 'sources': result['sources']}
+            
+        except Exception as e:
+            print(f"Error in RAG streaming: {e}")
+            if parts:
+                # Part of the answer is already on the wire; just report the failure
+                yield {'type': 'error', 'error': 'Response generation was interrupted'}
+                return
+            result = self._error_response(context)
+            yield {'type': 'token', 'text': result['answer']}
+            yield {'type': 'done', 'has_context': result['has_context'], 'sources': result['sources']}
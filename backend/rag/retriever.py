@@ -1,14 +1,68 @@
 from embeddings import EmbeddingGenerator
-from vector_store import VectorStore
+from vector_store import VectorStore, chunk_faiss_id
+from lexical_index import BM25Index, tokenize, is_identifier
+from context_builder import assemble_context, estimate_tokens
+from cache import LRUCache
+import numpy as np
+import threading
+import weakref
+import atexit
+import re
 import os
 
+# Newest Retriever that persists its query cache; older ones (replaced by a
+# reload) are neither kept alive nor allowed to overwrite its file at exit
+_query_cache_owner = None
+
+
+def _save_query_cache_at_exit():
+    retriever = _query_cache_owner() if _query_cache_owner is not None else None
+    if retriever is not None:
+        retriever.save_query_cache()
+
+
+atexit.register(_save_query_cache_at_exit)
+
+
+def normalize_query(query):
+    """Case/whitespace/trailing-punctuation insensitive cache key for a question"""
+    return re.sub(r'\s+', ' ', query.lower()).strip().rstrip('?!. ')
+
 class Retriever:
-    def __init__(self, vector_store_path="rag_index.faiss", metadata_path="rag_metadata.pkl"):
+    def __init__(self, vector_store_path="rag_index.faiss", metadata_path="rag_metadata.jsonl",
+                 embedder=None, documents_folder="rag_documents"):
         print("Initializing Retriever...")
-        self.embedder = EmbeddingGenerator()
-        self.vector_store = VectorStore()
+        self.embedder = embedder or EmbeddingGenerator()
+        self.documents_folder = documents_folder
+        self.vector_store = VectorStore(vector_store_path, metadata_path)
         self.vector_store_path = vector_store_path
         self.metadata_path = metadata_path
+        self._update_lock = threading.Lock()
+        
+        # Repeated FAQ-style questions skip the embedding API call
+        self.query_cache = LRUCache(
+            max_size=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+        )
+        self.query_cache_path = os.getenv("QUERY_EMBEDDING_CACHE_PATH", "query_embedding_cache.npz")
+        self._unsaved_queries = 0
+        if self.query_cache_path:
+            global _query_cache_owner
+            self._load_query_cache()
+            _query_cache_owner = weakref.ref(self)
+        
+        # BM25 over the same chunks catches exact error codes and section numbers
+        self.hybrid_search = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+        self.lexical_fast_path = os.getenv("RAG_LEXICAL_FAST_PATH", "true").lower() == "true"
+        self.lexical_fast_path_max_terms = int(os.getenv("RAG_LEXICAL_FAST_PATH_MAX_TERMS", "5"))
+        self.rrf_k = int(os.getenv("RAG_RRF_K", "60"))
+        self.lexical_index = BM25Index()
+        
+        # Prompt context: candidates retrieved, MMR relevance/diversity trade-off, token budget
+        self.context_candidates = int(os.getenv("RAG_CONTEXT_CANDIDATES", "8"))
+        self.mmr_lambda = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+        self.context_token_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "500"))
+        
         self._load_or_create_index()
     
     def _load_or_create_index(self):
@@ -19,38 +73,215 @@ class Retriever:
             self._create_index()
         else:
             print("Existing index loaded successfully")
+            self._build_lexical_index()
+    
+    def _build_lexical_index(self):
+        self.lexical_index.clear()
+        self.lexical_index.add(self.vector_store.metadata.items())
+        print(f"Lexical index built over {len(self.lexical_index)} chunks")
     
     def _create_index(self):
-        """Create new vector index from documents"""
+        """Create new vector index from documents.
+        
+        Chunks stream from the parsing pool into batched embedding and straight into
+        a fresh index, which replaces the live one only once it is complete.
+        """
         from document_loader import DocumentLoader
         
         print("Creating new vector index...")
-        loader = DocumentLoader()
-        documents = loader.load_all_documents()
-        
-        if not documents:
+        loader = DocumentLoader(self.documents_folder)
+        _, _, document_state = loader.diff_documents({})
+        if not document_state:
             raise ValueError("No documents found to index")
         
-        print(f"Processing {len(documents)} document chunks...")
+        store = VectorStore(self.vector_store_path, self.metadata_path)
+        batch_size = int(os.getenv("RAG_INGEST_BATCH_SIZE", "200"))
+        total = 0
+        indexed = 0
+        batch = []
         
-        # Extract just the text content for embedding
-        texts = [doc['content'] for doc in documents]
-        embeddings = self.embedder.generate_embeddings_batch(texts)
+        def index_batch(documents):
+            # Extract just the text content for embedding
+            embeddings = self.embedder.generate_embeddings_batch([doc['content'] for doc in documents])
+            
+            # Drop chunks that failed to embed together with their metadata so both stay aligned
+            pairs = [(embedding, doc) for embedding, doc in zip(embeddings, documents) if embedding is not None]
+            if len(pairs) < len(documents):
+                print(f"Skipping {len(documents) - len(pairs)} chunks without embeddings")
+            if pairs:
+                store.add_documents([embedding for embedding, _ in pairs], [doc for _, doc in pairs])
+            return len(pairs)
+        
+        for document in loader.iter_documents(list(document_state)):
+            batch.append(document)
+            total += 1
+            if len(batch) >= batch_size:
+                indexed += index_batch(batch)
+                batch = []
+        if batch:
+            indexed += index_batch(batch)
         
-        if not embeddings:
+        if not total:
+            raise ValueError("No documents found to index")
+        if not indexed:
             raise ValueError("Failed to generate embeddings")
         
+        print(f"Indexed {indexed} of {total} document chunks")
+        
         # Store documents with embeddings
-        self.vector_store.create_index(embeddings, documents)
-        self.vector_store.save_index()
+        store.finalize_index()
+        store.document_state = document_state
+        store.save_index()
+        self.vector_store = store
+        self._build_lexical_index()
         print("Index created and saved successfully")
     
+    def update_index(self):
+        """Re-index only the policy documents that were added, changed or removed.
+        
+        Embedding happens before the index is touched, and the swap itself is a
+        single locked step, so queries keep being served throughout.
+        """
+        with self._update_lock:
+            return self._update_index()
+    
+    def _update_index(self):
+        from document_loader import DocumentLoader
+        
+        loader = DocumentLoader(self.documents_folder)
+        changed, removed, current_state = loader.diff_documents(self.vector_store.document_state)
+        
+        if not changed and not removed:
+            print("RAG index is up to date")
+            return {'changed': [], 'removed': [], 'chunks_added': 0}
+        
+        print(f"Updating index - changed: {changed}, removed: {removed}")
+        documents = loader.load_documents(changed)
+        embeddings = self.embedder.generate_embeddings_batch([doc['content'] for doc in documents])
+        
+        pairs = [(embedding, doc) for embedding, doc in zip(embeddings, documents) if embedding is not None]
+        if len(pairs) < len(documents):
+            print(f"Skipping {len(documents) - len(pairs)} chunks without embeddings")
+        
+        self.vector_store.apply_update(
+            removed + changed,
+            [embedding for embedding, _ in pairs],
+            [doc for _, doc in pairs],
+            {filename: current_state[filename] for filename in changed}
+        )
+        self.vector_store.save_index()
+        
+        self.lexical_index.remove_sources(removed + changed)
+        self.lexical_index.add((chunk_faiss_id(doc['chunk_id']), doc) for _, doc in pairs)
+        
+        return {'changed': changed, 'removed': removed, 'chunks_added': len(pairs)}
+    
+    def _load_query_cache(self):
+        if not os.path.exists(self.query_cache_path):
+            return
+        try:
+            data = np.load(self.query_cache_path, allow_pickle=False)
+            for key, vector, expires_at in zip(data["keys"], data["vectors"], data["expires_at"]):
+                self.query_cache.set(str(key), vector.tolist(), expires_at=float(expires_at))
+            print(f"Loaded {len(self.query_cache)} cached query embeddings")
+        except Exception as e:
+            print(f"Could not load query embedding cache: {e}")
+    
+    def save_query_cache(self):
+        """Persist live query embeddings so a restart doesn't start cold"""
+        if not self.query_cache_path:
+            return
+        entries = self.query_cache.items()
+        if not entries:
+            return
+        try:
+            tmp_path = self.query_cache_path + ".tmp.npz"
+            np.savez(
+                tmp_path,
+                keys=np.array([key for key, _, _ in entries]),
+                vectors=np.array([value for _, value, _ in entries], dtype=np.float32),
+                expires_at=np.array([e if e is not None else np.inf for _, _, e in entries], dtype=np.float64)
+            )
+            os.replace(tmp_path, self.query_cache_path)
+            self._unsaved_queries = 0
+        except Exception as e:
+            print(f"Could not save query embedding cache: {e}")
+    
+    def get_query_embedding(self, query):
+        """Query embedding, served from the LRU cache when the question was seen before"""
+        key = normalize_query(query)
+        embedding = self.query_cache.get(key)
+        if embedding is not None:
+            print("Using cached query embedding")
+            return embedding
+        
+        embedding = self.embedder.generate_query_embedding(query)
+        if embedding:
+            self.query_cache.set(key, embedding)
+            self._unsaved_queries += 1
+            if self.query_cache_path and self._unsaved_queries >= 50:
+                self.save_query_cache()
+        return embedding
+    
+    def lexical_lookup_terms(self, query):
+        """Indexed identifier-like terms (error codes, section numbers) when the query is a short lookup.
+        
+        Returns an empty list unless the lexical fast path applies to the query.
+        """
+        if not (self.hybrid_search and self.lexical_fast_path):
+            return []
+        terms = tokenize(query)
+        if len(terms) > self.lexical_fast_path_max_terms:
+            return []
+        # Plain numbers ("within 7 days") are ordinary words here and go through hybrid retrieval
+        return [t for t in terms if is_identifier(t) and t in self.lexical_index]
+    
+    def _lexical_results(self, query, k, required_terms=None):
+        """BM25 hits as result dicts.
+        
+        'lexical_score' is the raw BM25 score; 'score' is that relative to the best
+        hit (0-1), which is only meaningful for the exact-identifier fast path.
+        """
+        hits = self.lexical_index.search(query, k=k, required_terms=required_terms)
+        if not hits:
+            return []
+        top = hits[0][1]
+        results = self.vector_store.get_documents((i, score / top) for i, score in hits)
+        raw = dict(hits)
+        for result in results:
+            result['lexical_score'] = raw[chunk_faiss_id(result['chunk_id'])]
+        return results
+    
+    def _fuse(self, ranked_lists, k):
+        """Reciprocal rank fusion, ordered by 'fusion_score'; 'score' stays the cosine similarity"""
+        fused = {}
+        for results in ranked_lists:
+            for rank, result in enumerate(results):
+                entry = fused.setdefault(result['chunk_id'], dict(result, fusion_score=0.0))
+                entry['fusion_score'] += 1.0 / (self.rrf_k + rank + 1)
+                if 'lexical_score' in result:
+                    entry['lexical_score'] = result['lexical_score']
+        return sorted(fused.values(), key=lambda r: r['fusion_score'], reverse=True)[:k]
+    
     def retrieve(self, query, k=5, min_score=0.3):
-        """Retrieve relevant documents for a query"""
+        """Retrieve relevant documents for a query.
+        
+        Dense results are fused with BM25 results via reciprocal rank fusion; short
+        lookups of an indexed error code or section number skip the embedding call.
+        'score' is the cosine similarity to the query for every fused result, so
+        min_score gates lexical hits on their dense similarity too. Fast-path results
+        have no embedding to compare against and score relative to the best BM25 hit.
+        """
         print(f"Retrieving documents for query: {query}")
         
+        lookup_terms = self.lexical_lookup_terms(query)
+        if lookup_terms:
+            filtered_results = self._lexical_results(query, k, required_terms=lookup_terms)
+            print(f"Lexical fast path for {lookup_terms}: {len(filtered_results)} results")
+            return self._annotate(query, filtered_results)
+        
         # Generate query embedding
-        query_embedding = self.embedder.generate_query_embedding(query)
+        query_embedding = self.get_query_embedding(query)
         if not query_embedding:
             print("Failed to generate query embedding")
             return []
@@ -59,16 +290,100 @@ class Retriever:
         results = self.vector_store.search(query_embedding, k=k)
         print(f"Found {len(results)} initial results")
         
+        return self._annotate(query, self._combine(query, query_embedding, results, k, min_score))
+    
+    def _combine(self, query, query_embedding, results, k, min_score):
         # Filter by minimum score
         filtered_results = [r for r in results if r['score'] >= min_score]
         print(f"After filtering: {len(filtered_results)} results above threshold {min_score}")
         
+        if self.hybrid_search:
+            lexical_results = self._lexical_results(query, k)
+            # Lexical hits take their cosine similarity, so sharing one term with the
+            # corpus isn't enough to pass min_score
+            dense_scores = {r['chunk_id']: r['score'] for r in results}
+            missing = [r for r in lexical_results if r['chunk_id'] not in dense_scores]
+            cosine, approximate = self._lexical_cosine(query_embedding, missing)
+            for result in lexical_results:
+                result['score'] = dense_scores.get(result['chunk_id'], cosine.get(result['chunk_id'], 0.0))
+            lexical_results = [r for r in lexical_results if r['score'] >= min_score or r['chunk_id'] in approximate]
+            filtered_results = self._fuse([filtered_results, lexical_results], k)
+            print(f"After fusing {len(lexical_results)} lexical results: {len(filtered_results)} results")
+        
+        return filtered_results
+    
+    def _lexical_cosine(self, query_embedding, results):
+        """({chunk_id: cosine}, chunk_ids whose score is only approximate) for lexical hits.
+        
+        Quantized indexes (IVFPQ, IVFSQ8) reconstruct lossy vectors, which can score an
+        exact match around 0.75, so those hits are re-scored against their stored
+        embeddings from the embedding cache. Chunks the cache doesn't have keep the
+        approximate score and are not dropped by min_score.
+        """
+        if not results:
+            return {}, set()
+        if self.vector_store.stores_exact_vectors():
+            scores = self.vector_store.score_ids(query_embedding, [chunk_faiss_id(r['chunk_id']) for r in results])
+            return {r['chunk_id']: scores[chunk_faiss_id(r['chunk_id'])] for r in results
+                    if chunk_faiss_id(r['chunk_id']) in scores}, set()
+        
+        cache = getattr(self.embedder, 'cache', None)
+        stored = cache.get_many([r['content'] for r in results]) if cache is not None else [None] * len(results)
+        query_vector = np.array(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        
+        scores = {}
+        approximate = [r for r, embedding in zip(results, stored) if embedding is None]
+        for result, embedding in zip(results, stored):
+            if embedding is not None:
+                vector = np.array(embedding, dtype=np.float32)
+                scores[result['chunk_id']] = float(np.dot(vector, query_vector) / (np.linalg.norm(vector) or 1.0))
+        if approximate:
+            estimates = self.vector_store.score_ids(query_embedding, [chunk_faiss_id(r['chunk_id']) for r in approximate])
+            for result in approximate:
+                scores[result['chunk_id']] = estimates.get(chunk_faiss_id(result['chunk_id']), 0.0)
+        return scores, {r['chunk_id'] for r in approximate}
+    
+    def _annotate(self, query, results):
         # Add relevance context
-        for result in filtered_results:
+        for result in results:
             result['query'] = query
             result['relevance'] = self._calculate_relevance(result['score'])
+        return results
+    
+    def retrieve_batch(self, queries, k=5, min_score=0.3):
+        """Retrieve for many queries at once; returns one result list per query.
         
-        return filtered_results
+        Uncached query embeddings are fetched in batched API calls and every dense
+        lookup runs in a single FAISS matrix search.
+        """
+        print(f"Retrieving documents for {len(queries)} queries")
+        all_results = [[] for _ in queries]
+        
+        dense = []
+        for i, query in enumerate(queries):
+            lookup_terms = self.lexical_lookup_terms(query)
+            if lookup_terms:
+                all_results[i] = self._annotate(query, self._lexical_results(query, k, required_terms=lookup_terms))
+            else:
+                dense.append(i)
+        
+        embeddings = {i: self.query_cache.get(normalize_query(queries[i])) for i in dense}
+        missing = [i for i in dense if embeddings[i] is None]
+        if missing:
+            print(f"Embedding {len(missing)} uncached queries in batch")
+            for i, embedding in zip(missing, self.embedder.generate_query_embeddings_batch([queries[i] for i in missing])):
+                embeddings[i] = embedding
+                if embedding:
+                    self.query_cache.set(normalize_query(queries[i]), embedding)
+                    self._unsaved_queries += 1
+        
+        dense = [i for i in dense if embeddings[i]]
+        if dense:
+            for i, results in zip(dense, self.vector_store.search_batch([embeddings[i] for i in dense], k=k)):
+                all_results[i] = self._annotate(queries[i], self._combine(queries[i], embeddings[i], results, k, min_score))
+        
+        return all_results
     
     def _calculate_relevance(self, score):
         """Convert similarity score to relevance level"""
@@ -81,34 +396,32 @@ class Retriever:
         else:
             return "very_low"
     
-    def get_context(self, query, max_context_length=2000):
+    def get_context(self, query, max_tokens=None):
         """Get concatenated context from retrieved documents"""
         print(f"Getting context for query: {query}")
-        results = self.retrieve(query)
+        return self.build_context(self.retrieve(query, k=self.context_candidates), max_tokens)
+    
+    def build_context(self, results, max_tokens=None):
+        """Source-attributed context within a token budget.
         
+        Chunks are chosen by maximal marginal relevance so overlapping neighbours
+        don't crowd out other relevant text, and consecutive chunks of one file are
+        merged back into a single passage.
+        """
         if not results:
             print("No relevant documents found")
             return ""
         
-        context_parts = []
-        current_length = 0
+        passages = assemble_context(results, max_tokens or self.context_token_budget, self.mmr_lambda)
         
-        for result in results:
-            content = result['content']
-            source = result['source']
-            
+        context_parts = []
+        for passage in passages:
             # Add source attribution
-            attributed_content = f"[From {source}]: {content}"
-            
-            if current_length + len(attributed_content) <= max_context_length:
-                context_parts.append(attributed_content)
-                current_length += len(attributed_content)
-                print(f"Added content from {source} (score: {result['score']:.3f})")
-            else:
-                break
+            context_parts.append(f"[From {passage['source']}]: {passage['content']}")
+            print(f"Added content from {passage['source']} (score: {passage['score']:.3f})")
         
         context = "\n\n".join(context_parts)
-        print(f"Final context length: {len(context)} characters")
+        print(f"Final context: {len(passages)} passages from {len(results)} results, ~{estimate_tokens(context)} tokens")
         return context
 
 if __name__ == "__main__":
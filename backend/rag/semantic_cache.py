@@ -0,0 +1,121 @@
+# semantic_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """Answer cache matched on query-embedding similarity instead of exact text.
+
+    Cached query embeddings live in a small in-memory FAISS index; a new query
+    reuses the stored answer when its cosine similarity to a cached query is at
+    least ``threshold``. Entries expire after ``ttl`` seconds and the least
+    recently used ones are evicted once ``max_size`` is reached.
+    """
+
+    def __init__(self, threshold=0.92, max_size=500, ttl=3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.index = None
+        self.dimension = None
+        self._entries = OrderedDict()  # id -> {"query", "response", "expires_at"}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _prepare_vector(self, embedding):
+        vector = np.array([embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, ids):
+        self.index.remove_ids(np.array(ids, dtype=np.int64))
+        for i in ids:
+            del self._entries[i]
+
+    def lookup(self, embedding):
+        """Return (response, score, cached_query) for the closest live entry, or None"""
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0 or len(embedding) != self.dimension:
+                self.misses += 1
+                return None
+
+            scores, ids = self.index.search(self._prepare_vector(embedding), min(5, self.index.ntotal))
+            now = time.time()
+            expired = []
+            match = None
+
+            for score, i in zip(scores[0], ids[0]):
+                if i == -1 or score < self.threshold:
+                    break
+                entry = self._entries[int(i)]
+                if entry["expires_at"] <= now:
+                    expired.append(int(i))
+                    continue
+                match = (int(i), float(score), entry)
+                break
+
+            if expired:
+                self._remove(expired)
+
+            if match is None:
+                self.misses += 1
+                return None
+
+            i, score, entry = match
+            self._entries.move_to_end(i)
+            self.hits += 1
+            return entry["response"], score, entry["query"]
+
+    def add(self, query, embedding, response, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        vector = self._prepare_vector(embedding)
+
+        with self._lock:
+            if self.index is None or len(embedding) != self.dimension:
+                # First entry, or the embedding model changed: start a fresh index
+                self.dimension = len(embedding)
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+                self._entries.clear()
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "query": query,
+                "response": response,
+                "expires_at": time.time() + ttl
+            }
+
+            overflow = len(self._entries) - self.max_size
+            if overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+                self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            if self.index is not None:
+                self.index.reset()
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
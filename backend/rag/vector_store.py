@@ -2,21 +2,201 @@
 
 import faiss
 import numpy as np
-import pickle
+import hashlib
+import threading
+import math
 import os
+from metadata_store import MetadataStore
+
+
+def chunk_faiss_id(chunk_id):
+    """Stable 63-bit FAISS id derived from a chunk_id string"""
+    digest = hashlib.sha1(chunk_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
 
 
 class VectorStore:
     def __init__(
         self,
         index_path="rag_index.faiss",
-        metadata_path="rag_metadata.pkl"
+        metadata_path="rag_metadata.jsonl",
+        mmap=None,
+        index_type=None,
+        nlist=None,
+        pq_m=None,
+        hnsw_m=None,
+        nprobe=None,
+        ef_search=None
     ):
         self.index_path = index_path
         self.metadata_path = metadata_path
+        # Index built by create_index: flat (exact), ivf, ivfpq, ivfsq8 or hnsw.
+        # nlist/pq_m of 0 are sized from the corpus when the index is trained.
+        self.index_type = (index_type or os.getenv("RAG_INDEX_TYPE", "flat")).lower()
+        self.nlist = nlist if nlist is not None else int(os.getenv("RAG_INDEX_NLIST", "0"))
+        self.pq_m = pq_m if pq_m is not None else int(os.getenv("RAG_INDEX_PQ_M", "0"))
+        self.hnsw_m = hnsw_m if hnsw_m is not None else int(os.getenv("RAG_INDEX_HNSW_M", "32"))
+        # Query-time recall/latency knobs for IVF and HNSW indexes
+        self.nprobe = nprobe if nprobe is not None else int(os.getenv("RAG_INDEX_NPROBE", "8"))
+        self.ef_search = ef_search if ef_search is not None else int(os.getenv("RAG_INDEX_EF_SEARCH", "64"))
+        # Memory-map the saved index so worker processes share one page-cache copy
+        self.mmap = mmap if mmap is not None else os.getenv("RAG_INDEX_MMAP", "true").lower() == "true"
+        self._mmapped = False
         self.index = None
-        self.metadata = []
+        self.metadata = {}
+        # (index, metadata) read by searches in one attribute load; writers build a
+        # new pair on the side and replace it, so searches never take a lock
+        self._snapshot = (None, self.metadata)
+        # True while a streaming build is filling an index nobody searches yet
+        self._building = False
         self.dimension = None
+        # source_file -> {"mtime", "hash"} of the indexed version
+        self.document_state = {}
+        # Serialises writers; searches only read self._snapshot
+        self._lock = threading.RLock()
+
+    def _factory_string(self, n_vectors):
+        nlist = self.nlist or max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+        if self.index_type == "ivf":
+            return f"IVF{nlist},Flat"
+        if self.index_type == "ivfsq8":
+            return f"IVF{nlist},SQ8"
+        if self.index_type == "ivfpq":
+            # Default to ~8 dimensions per sub-quantizer
+            pq_m = self.pq_m or max(m for m in range(1, self.dimension // 8 + 1) if self.dimension % m == 0)
+            return f"IVF{nlist},PQ{pq_m}"
+        if self.index_type == "hnsw":
+            return f"HNSW{self.hnsw_m}"
+        return "Flat"
+
+    def _new_index(self, training_vectors=None):
+        """Empty id-addressable index of the configured type, trained on ``training_vectors`` if needed"""
+        n_vectors = len(training_vectors) if training_vectors is not None else 0
+        description = self._factory_string(n_vectors) if n_vectors else "Flat"
+
+        if description == "Flat":
+            # Cosine similarity using inner product, addressable by chunk id
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+        try:
+            index = faiss.index_factory(self.dimension, description, faiss.METRIC_INNER_PRODUCT)
+            if not index.is_trained:
+                index.train(training_vectors)
+        except Exception as e:
+            # Quantizers need enough training points; small corpora stay exact
+            print(f"Could not build {description} index ({e}), using a flat index")
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+        print(f"Built {description} index")
+        if isinstance(index, faiss.IndexIVF):
+            # IVF lists store ids natively; IndexIDMap2 would assume removals renumber
+            # rows, which IVF doesn't do. The hashtable supports reconstruct by id.
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        else:
+            index = faiss.IndexIDMap2(index)
+        self._apply_search_params(index)
+        return index
+
+    @staticmethod
+    def _inner(index):
+        """The underlying index, unwrapping an id map"""
+        return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+    @staticmethod
+    def _index_ids(index):
+        """FAISS ids stored in ``index``, in storage order"""
+        if isinstance(index, faiss.IndexIDMap):
+            return faiss.vector_to_array(index.id_map)
+        invlists = index.invlists
+        lists = [
+            faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).copy()
+            for i in range(invlists.nlist) if invlists.list_size(i)
+        ]
+        return np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+
+    def _publish(self, index, metadata):
+        """Make ``index`` / ``metadata`` the version that searches see"""
+        self._snapshot = (index, metadata)
+        self.index = index
+        self.metadata = metadata
+
+    def _apply_search_params(self, index=None):
+        index = index or self.index
+        inner = self._inner(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = self.ef_search
+            return
+        try:
+            faiss.extract_index_ivf(inner).nprobe = self.nprobe
+        except RuntimeError:
+            pass  # flat index, nothing to tune
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Change the IVF nprobe / HNSW efSearch used by subsequent searches"""
+        with self._lock:
+            if nprobe is not None:
+                self.nprobe = nprobe
+            if ef_search is not None:
+                self.ef_search = ef_search
+            if self.index is not None:
+                self._apply_search_params()
+
+    def _is_flat(self, index=None):
+        return isinstance(self._inner(index or self.index), faiss.IndexFlat)
+
+    def _is_hnsw(self, index=None):
+        return isinstance(self._inner(index or self.index), faiss.IndexHNSW)
+
+    def stores_exact_vectors(self):
+        """Whether reconstruct() returns the indexed vectors exactly; PQ and SQ codes are lossy"""
+        inner = self._inner(self._snapshot[0])
+        if isinstance(inner, faiss.IndexHNSW):
+            inner = faiss.downcast_index(inner.storage)
+        return isinstance(inner, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+    def get_vectors(self, index=None):
+        """(ids, vectors) currently in the index; approximate for quantized indexes"""
+        index = index or self.index
+        if index is None or index.ntotal == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dimension or 0), dtype=np.float32)
+        ids = self._index_ids(index)
+        if isinstance(index, faiss.IndexIDMap):
+            return ids, index.index.reconstruct_n(0, index.ntotal)
+        return ids, index.reconstruct_batch(ids)
+
+    def _writable_index(self):
+        """An in-memory index that can be modified without affecting searches on self.index"""
+        if self._mmapped:
+            if self._is_flat():
+                ids, vectors = self.get_vectors()
+                index = self._new_index()
+                index.add_with_ids(vectors, ids)
+                return index
+            # Rebuilding from quantized codes would lose precision; the saved file matches memory
+            index = faiss.read_index(self.index_path)
+            self._apply_search_params(index)
+            return index
+        return faiss.clone_index(self.index)
+
+    def _without_ids(self, index, ids):
+        """``index`` minus ``ids``; HNSW graphs don't support deletion, so they are rebuilt"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return index
+        if self._is_hnsw(index):
+            all_ids, vectors = self.get_vectors(index)
+            keep = ~np.isin(all_ids, ids)
+            rebuilt = self._new_index(vectors[keep])
+            rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+            return rebuilt
+        index.remove_ids(ids)
+        return index
+
+    def _prepare_vectors(self, embeddings):
+        vectors = np.array(embeddings, dtype=np.float32)
+        # Normalize vectors for cosine similarity
+        faiss.normalize_L2(vectors)
+        return vectors
 
     def create_index(self, embeddings, documents):
         """Create FAISS index from embeddings and documents"""
@@ -24,69 +204,257 @@ class VectorStore:
             raise ValueError("No embeddings or documents provided")
 
         # Detect embedding dimension dynamically
-        self.dimension = len(embeddings[0])
-        print(f"Creating index with dimension: {self.dimension}")
+        dimension = len(embeddings[0])
+        print(f"Creating index with dimension: {dimension}")
 
-        # Cosine similarity using inner product
-        self.index = faiss.IndexFlatIP(self.dimension)
+        vectors = self._prepare_vectors(embeddings)
+        ids = np.array([chunk_faiss_id(doc["chunk_id"]) for doc in documents], dtype=np.int64)
 
-        vectors = np.array(embeddings, dtype=np.float32)
-        self.metadata = documents
+        with self._lock:
+            self.dimension = dimension
+            index = self._new_index(vectors)
+            index.add_with_ids(vectors, ids)
+            self._publish(index, {int(i): doc for i, doc in zip(ids, documents)})
+            self._mmapped = False
+            self._building = False
 
-        # Normalize vectors for cosine similarity
-        faiss.normalize_L2(vectors)
+        print(f"FAISS index created with {index.ntotal} vectors")
+
+    def finalize_index(self):
+        """Rebuild an incrementally filled flat index as the configured index type.
+        
+        Quantized indexes need the whole corpus for training, so streaming builds
+        collect into a flat index first.
+        """
+        with self._lock:
+            self._building = False
+            if self.index is None or self.index_type == "flat" or not self._is_flat():
+                return
+            ids, vectors = self.get_vectors()
+            index = self._new_index(vectors)
+            index.add_with_ids(vectors, ids)
+            self._publish(index, self.metadata)
+
+    def _add(self, index, metadata, embeddings, documents):
+        """Add (or replace) chunks in ``index`` / ``metadata``; returns the resulting index"""
+        vectors = self._prepare_vectors(embeddings)
+        ids = np.array([chunk_faiss_id(doc["chunk_id"]) for doc in documents], dtype=np.int64)
+
+        # Re-adding an existing chunk id would leave a duplicate vector behind
+        existing = [int(i) for i in ids if int(i) in metadata]
+        index = self._without_ids(index, existing)
+        index.add_with_ids(vectors, ids)
+        for i, doc in zip(ids, documents):
+            metadata[int(i)] = doc
+        return index
 
-        self.index.add(vectors)
-        print(f"FAISS index created with {self.index.ntotal} vectors")
+    def _remove(self, index, metadata, document_state, source_files):
+        """Drop the chunks of ``source_files``; returns (resulting index, chunks removed)"""
+        ids = [i for i, doc in metadata.items() if doc["source"] in source_files]
+        if ids:
+            index = self._without_ids(index, ids)
+            for i in ids:
+                del metadata[i]
+        for source in source_files:
+            document_state.pop(source, None)
+        return index, len(ids)
+
+    def add_documents(self, embeddings, documents):
+        """Add (or replace) chunks in the existing index"""
+        if not embeddings:
+            return
+
+        with self._lock:
+            if self.index is None:
+                # Built up incrementally; finalize_index() converts it to the configured type
+                self.dimension = len(embeddings[0])
+                self._publish(self._new_index(), {})
+                self._mmapped = False
+                self._building = True
+            if self._building:
+                # Not searched until the build is finished, so extend it in place
+                index = self._add(self.index, self.metadata, embeddings, documents)
+                self._publish(index, self.metadata)
+            else:
+                metadata = self.metadata.copy()
+                index = self._add(self._writable_index(), metadata, embeddings, documents)
+                self._publish(index, metadata)
+                self._mmapped = False
+
+        print(f"Added {len(documents)} chunks, index now has {index.ntotal} vectors")
+
+    def remove_documents(self, source_files):
+        """Remove every chunk that came from the given source files"""
+        source_files = set(source_files)
+
+        with self._lock:
+            if self.index is None:
+                return 0
+            metadata = self.metadata.copy()
+            state = dict(self.document_state)
+            index, removed = self._remove(self._writable_index(), metadata, state, source_files)
+            self._publish(index, metadata)
+            self._mmapped = False
+            self.document_state = state
+
+        print(f"Removed {removed} chunks from {len(source_files)} documents")
+        return removed
+
+    def apply_update(self, removed_sources, embeddings, documents, document_state):
+        """Replace changed documents' chunks on a copy of the index and swap it in.
+
+        The live index is untouched until the whole update has succeeded, so a
+        failure part-way leaves the previous version searchable.
+        """
+        source_files = set(removed_sources)
+
+        with self._lock:
+            if self.index is None:
+                raise ValueError("Index not loaded")
+            index = self._writable_index()
+            metadata = self.metadata.copy()
+            state = dict(self.document_state)
+
+            index, removed = self._remove(index, metadata, state, source_files)
+            if embeddings:
+                index = self._add(index, metadata, embeddings, documents)
+            state.update(document_state)
+
+            self._publish(index, metadata)
+            self._mmapped = False
+            self.document_state = state
+
+        print(f"Updated index: removed {removed} chunks, added {len(documents)}, now {index.ntotal} vectors")
 
     def save_index(self):
         """Persist FAISS index and metadata"""
         if self.index is None:
             raise ValueError("Index not initialized")
 
-        faiss.write_index(self.index, self.index_path)
+        with self._lock:
+            # Write to temp files and swap so other workers never read a partial index
+            faiss.write_index(self.index, self.index_path + ".tmp")
+            tmp_metadata_path, tmp_table_path = MetadataStore.write(
+                self.metadata_path,
+                list(self.metadata.items()),
+                {"dimension": self.dimension, "document_state": self.document_state}
+            )
 
-        with open(self.metadata_path, "wb") as f:
-            pickle.dump({
-                "dimension": self.dimension,
-                "metadata": self.metadata
-            }, f)
+            # The old store is not closed: in-flight searches may still be reading it,
+            # and its mapped files stay valid after the replace until it is collected
+            os.replace(self.index_path + ".tmp", self.index_path)
+            os.replace(tmp_metadata_path, self.metadata_path)
+            os.replace(tmp_table_path, MetadataStore.index_path(self.metadata_path))
+            self._publish(self.index, MetadataStore(self.metadata_path))
 
         print("Index and metadata saved successfully")
 
     def load_index(self):
         """Load FAISS index and metadata"""
-        if not os.path.exists(self.index_path) or not os.path.exists(self.metadata_path):
+        if not os.path.exists(self.index_path) or not MetadataStore.exists(self.metadata_path):
+            if os.path.exists(os.path.splitext(self.metadata_path)[0] + ".pkl"):
+                # Pickled metadata is no longer read; rebuilding reuses cached embeddings
+                print("Found legacy pickled RAG metadata, the index will be rebuilt")
             return False
 
-        self.index = faiss.read_index(self.index_path)
+        index = None
+        if self.mmap:
+            try:
+                flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+                index = faiss.read_index(self.index_path, flags)
+            except Exception as e:
+                print(f"Memory-mapped index load failed, reading into memory: {e}")
+        mmapped = index is not None
+        if index is None:
+            index = faiss.read_index(self.index_path)
+
+        if isinstance(index, faiss.IndexIDMap) and isinstance(faiss.downcast_index(index.index), faiss.IndexIVF):
+            # Id-mapped IVF indexes lose track of chunks on removal; rebuild from cached embeddings
+            print("Found an id-mapped IVF index from an older version, the index will be rebuilt")
+            return False
 
-        with open(self.metadata_path, "rb") as f:
-            data = pickle.load(f)
-            self.dimension = data["dimension"]
-            self.metadata = data["metadata"]
+        metadata = MetadataStore(self.metadata_path)
 
-        print(f"Loaded FAISS index with {self.index.ntotal} vectors")
+        self._apply_search_params(index)
+
+        with self._lock:
+            self._publish(index, metadata)
+            self._mmapped = mmapped
+            self._building = False
+            self.dimension = metadata.header["dimension"]
+            self.document_state = metadata.header.get("document_state", {})
+
+        print(f"Loaded FAISS index with {self.index.ntotal} vectors" + (" (memory-mapped)" if mmapped else ""))
         return True
 
     def search(self, query_embedding, k=5):
         """Search similar vectors"""
-        if self.index is None:
+        index, metadata = self._snapshot
+        if index is None:
             raise ValueError("Index not loaded")
 
         query_vector = np.array([query_embedding], dtype=np.float32)
         faiss.normalize_L2(query_vector)
 
-        scores, indices = self.index.search(query_vector, k)
+        scores, indices = index.search(query_vector, k)
+        return self._documents(
+            metadata, ((int(idx), float(score)) for score, idx in zip(scores[0], indices[0]) if idx != -1)
+        )
+
+    def search_batch(self, query_embeddings, k=5):
+        """Search many queries with one matrix search; returns one result list per query"""
+        index, metadata = self._snapshot
+        if index is None:
+            raise ValueError("Index not loaded")
+        if not query_embeddings:
+            return []
+
+        query_vectors = self._prepare_vectors(query_embeddings)
+
+        scores, indices = index.search(query_vectors, k)
+        return [
+            self._documents(
+                metadata, ((int(idx), float(score)) for score, idx in zip(row_scores, row_indices) if idx != -1)
+            )
+            for row_scores, row_indices in zip(scores, indices)
+        ]
+
+    def score_ids(self, query_embedding, ids):
+        """Cosine similarity of the query to specific indexed chunks, {faiss_id: score}.
+
+        Scores come from reconstructed vectors, so they are approximate unless
+        stores_exact_vectors() is true.
+        """
+        index, _ = self._snapshot
+        if index is None:
+            raise ValueError("Index not loaded")
+
+        query_vector = np.array(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+
+        scores = {}
+        for faiss_id in ids:
+            try:
+                vector = index.reconstruct(int(faiss_id))
+            except RuntimeError:
+                continue  # no longer indexed
+            scores[int(faiss_id)] = float(np.dot(vector, query_vector))
+        return scores
+
+    def get_documents(self, scored_ids):
+        """Search-result dicts for (faiss_id, score) pairs, skipping ids no longer indexed"""
+        return self._documents(self._snapshot[1], scored_ids)
 
+    @staticmethod
+    def _documents(metadata, scored_ids):
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx == -1:
+        for faiss_id, score in scored_ids:
+            if faiss_id not in metadata:
                 continue
 
-            doc = self.metadata[idx]
+            doc = metadata[faiss_id]
             results.append({
-                "score": float(score),
+                "score": score,
                 "content": doc["content"],
                 "source": doc["source"],
                 "chunk_id": doc["chunk_id"],
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# app.py puts the RAG package on sys.path; its modules import each other by bare name
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'rag'))
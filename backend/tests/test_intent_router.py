@@ -0,0 +1,21 @@
+import pytest
+
+from intent_router import IntentRouter, POLICY_RAG, GENERAL
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(use_classifier=False)
+
+
+@pytest.mark.parametrize("message", ["What is U20?", "S31 meaning", "u20", "Explain section 4.2.1"])
+def test_code_only_queries_route_to_policy_rag(router, message):
+    route = router.route(message)
+
+    assert route.intent == POLICY_RAG
+    assert route.is_banking
+
+
+@pytest.mark.parametrize("message", ["what happened in 2025", "is it the 2nd"])
+def test_plain_numbers_are_not_identifiers(router, message):
+    assert router.route(message).intent == GENERAL
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from vector_store import VectorStore
+from retriever import Retriever
+
+DIMENSION = 8
+
+CHUNKS = [
+    {"chunk_id": "refund_0", "source": "refund_policy.docx",
+     "content": "Refunds for failed transactions are credited within 7 working days."},
+    {"chunk_id": "auth_0", "source": "authentication_policy.docx",
+     "content": "Accounts are locked for 7 minutes after repeated wrong OTP entries."},
+    {"chunk_id": "errors_0", "source": "error_codes.docx",
+     "content": "Error U20 means the beneficiary bank did not respond in time."}
+]
+
+
+def _vector(i):
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    vector[i] = 1.0
+    return vector.tolist()
+
+
+class StubEmbedder:
+    """Embeds every query as the refund chunk's vector"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_query_embedding(self, query):
+        self.calls += 1
+        return _vector(0)
+
+
+@pytest.fixture
+def retriever(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUERY_EMBEDDING_CACHE_PATH", "")
+    monkeypatch.setenv("RAG_INDEX_MMAP", "false")
+    index_path = str(tmp_path / "rag_index.faiss")
+    metadata_path = str(tmp_path / "rag_metadata.jsonl")
+
+    store = VectorStore(index_path, metadata_path)
+    store.create_index([_vector(i) for i in range(len(CHUNKS))], CHUNKS)
+    store.save_index()
+
+    return Retriever(index_path, metadata_path, embedder=StubEmbedder(), documents_folder=str(tmp_path))
+
+
+def test_plain_number_question_uses_dense_search(retriever):
+    assert retriever.lexical_lookup_terms("refund within 7 days") == []
+
+    results = retriever.retrieve("refund within 7 days", k=3)
+
+    assert retriever.embedder.calls == 1
+    assert results[0]["chunk_id"] == "refund_0"
+    assert "auth_0" not in [r["chunk_id"] for r in results]
+
+
+def test_error_code_question_takes_lexical_fast_path(retriever):
+    assert retriever.lexical_lookup_terms("What is U20?") == ["u20"]
+
+    results = retriever.retrieve("What is U20?", k=3)
+
+    assert retriever.embedder.calls == 0
+    assert [r["chunk_id"] for r in results] == ["errors_0"]
+
+
+class DictEmbeddingCache:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def get_many(self, texts):
+        return [self.embeddings.get(text) for text in texts]
+
+
+def test_lexical_hits_on_quantized_index_score_against_stored_embeddings(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUERY_EMBEDDING_CACHE_PATH", "")
+    monkeypatch.setenv("RAG_INDEX_MMAP", "false")
+    monkeypatch.setenv("RAG_INDEX_TYPE", "ivfpq")
+    index_path = str(tmp_path / "rag_index.faiss")
+    metadata_path = str(tmp_path / "rag_metadata.jsonl")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [{"chunk_id": f"c{i}", "source": "faq.docx", "content": f"filler text number {i}"} for i in range(400)]
+    chunks[7]["content"] = "Error U20 means the beneficiary bank did not respond in time."
+
+    store = VectorStore(index_path, metadata_path)
+    store.create_index(vectors.tolist(), chunks)
+    store.save_index()
+    assert not store.stores_exact_vectors()
+
+    embedder = StubEmbedder()
+    embedder.cache = DictEmbeddingCache({c["content"]: v.tolist() for c, v in zip(chunks, vectors)})
+    retriever = Retriever(index_path, metadata_path, embedder=embedder, documents_folder=str(tmp_path))
+
+    query_embedding = vectors[7].tolist()
+    hits = retriever._lexical_results("beneficiary bank U20 respond", k=3)
+    scores, approximate = retriever._lexical_cosine(query_embedding, hits)
+
+    assert approximate == set()
+    assert scores["c7"] == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,4 @@
+# Entry point for WSGI servers, e.g. `gunicorn wsgi:app`
+from app import app, start_background_services
+
+start_background_services()
@@ -149,30 +149,15 @@ const KYCVerification = ({ setKycCompleted, onKycComplete }) => {
           const refId = completeData.kyc_id || 'KYC-' + Date.now();
           setReferenceId(refId);
           
-          // Check if KYC was auto-approved
-          if (completeData.status === 'verified' && completeData.auto_approved) {
+          if (completeData.job_id) {
+            // Documents are verified in the background; poll the job until it finishes
             setTimeout(() => {
-              setNotification({
-                type: 'success',
-                message: `🎉 KYC Auto-Approved! Documents matched your profile. Bank account created. Reference ID: ${refId}`
-              });
-              setKycStatus('verified');
-              setKycCompleted && setKycCompleted(true);
-              onKycComplete && onKycComplete();
+              pollKycJob(completeData.job_id, refId);
             }, 2000);
+          } else if (completeData.status === 'verified' && completeData.auto_approved) {
+            handleKycAutoApproved(refId);
           } else {
-            // Update notification with reference ID
-            setTimeout(() => {
-              setNotification({
-                type: 'info',
-                message: `📋 Documents under review. Reference ID: ${refId}`
-              });
-            }, 1500);
-            
-            // Start polling for status updates
-            setTimeout(() => {
-              pollKycStatus();
-            }, 5000);
+            handleKycUnderReview(refId);
           }
         } else {
           setNotification({
@@ -201,6 +186,54 @@ const KYCVerification = ({ setKycCompleted, onKycComplete }) => {
     }
   };
   
+  const handleKycAutoApproved = (refId) => {
+    setTimeout(() => {
+      setNotification({
+        type: 'success',
+        message: `🎉 KYC Auto-Approved! Documents matched your profile. Bank account created. Reference ID: ${refId}`
+      });
+      setKycStatus('verified');
+      setKycCompleted && setKycCompleted(true);
+      onKycComplete && onKycComplete();
+    }, 2000);
+  };
+  
+  const handleKycUnderReview = (refId) => {
+    // Update notification with reference ID
+    setTimeout(() => {
+      setNotification({
+        type: 'info',
+        message: `📋 Documents under review. Reference ID: ${refId}`
+      });
+    }, 1500);
+    
+    // Start polling for status updates
+    setTimeout(() => {
+      pollKycStatus();
+    }, 5000);
+  };
+  
+  const pollKycJob = async (jobId, refId) => {
+    try {
+      const response = await fetch(`http://localhost:5000/api/kyc/jobs/${jobId}`);
+      const data = await response.json();
+      
+      if (data.success && (data.job_status === 'queued' || data.job_status === 'processing')) {
+        // Continue polling while OCR and validation are running
+        setTimeout(() => {
+          pollKycJob(jobId, refId);
+        }, 2000);
+      } else if (data.success && data.status === 'verified' && data.auto_approved) {
+        handleKycAutoApproved(refId);
+      } else {
+        handleKycUnderReview(refId);
+      }
+    } catch (error) {
+      console.error('Error polling KYC job:', error);
+      handleKycUnderReview(refId);
+    }
+  };
+  
   const pollKycStatus = async () => {
     try {
       const userId = localStorage.getItem('user_id');